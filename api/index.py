@@ -7,7 +7,10 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 backend_path = os.path.join(root_dir, 'backend')
 sys.path.insert(0, backend_path)
 
-# Import the FastAPI app from backend_server
+# Import the FastAPI app from backend_server (timed to keep cold starts visible)
+import time
+_import_start = time.perf_counter()
 from backend_server import app
+print(f"[INFO] Cold start: backend_server imported in {(time.perf_counter() - _import_start) * 1000:.0f} ms")
 
 # This is required for Vercel to find the app instance
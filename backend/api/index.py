@@ -4,8 +4,11 @@ import os
 # Add parent directory to sys.path for Vercel
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import the FastAPI app from backend_server
+# Import the FastAPI app from backend_server (timed to keep cold starts visible)
+import time
+_import_start = time.perf_counter()
 from backend_server import app
+print(f"[INFO] Cold start: backend_server imported in {(time.perf_counter() - _import_start) * 1000:.0f} ms")
 
 # This is the entry point for Vercel Serverless Functions
 # Vercel looks for a variable named 'app' or 'handler'
@@ -1,13 +1,18 @@
 import os
-import uvicorn
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi import Request
 import httpx
+import time
 import json
+import hashlib
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 import io
 import vercel_blob
@@ -16,18 +21,56 @@ import vercel_blob
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Load environment variables (before database/auth read their settings)
+load_dotenv()
+
 # Import database and auth modules
-from database import init_db, get_db, User, HistoryRecord, GlossaryTerm, ReferenceDocument
+# Heavy or rarely used modules (pypdf, passlib, uvicorn) are
+# imported on first use to keep serverless cold starts short. The schema is
+# created lazily by get_db() on the first request that touches the database.
+from database import get_db, get_read_db, get_collection_version, engine, read_engine, User, HistoryRecord, GlossaryTerm, ReferenceDocument, ReferenceText, ChatSessionRecord
 from auth import verify_password, get_password_hash, create_access_token, verify_token
+from prompt_budget import PromptBuilder, BuiltPrompt, resolve_model, estimate_tokens
+import metrics
+from http_cache import versioned_json_response
+from chat_sessions import ChatSession, CHAT_PROMPT_TEMPLATE, CHAT_SESSION_IDLE_SECONDS, chat_sessions
+from text_diff import ParagraphDiffer
+from cache import get_cache
 
-# Load environment variables
-load_dotenv()
-
-# Initialize database
-init_db()
+metrics.instrument_engine(engine)
+if read_engine is not engine:
+    metrics.instrument_engine(read_engine)
 
 app = FastAPI()
 
+# Record per-route latency (time until the response starts)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status,
+        )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    for tier, stats in (await run_in_threadpool(get_cache().stats)).items():
+        metrics.CACHE_UP.set(stats["up"], tier=tier)
+        if stats["up"]:
+            metrics.CACHE_BYTES.set(stats.get("bytes", 0), tier=tier)
+            metrics.CACHE_ENTRIES.set(stats.get("entries", 0), tier=tier)
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +78,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Prompt-Tokens", "X-Prompt-Budget", "ETag"],
 )
 
 # Pydantic models
@@ -42,6 +86,9 @@ class PolishRequest(BaseModel):
     text: str
     model: str
     apiKey: Optional[str] = None
+    # "text" streams the polished text; "edits" streams word-level edit
+    # operations against the original as NDJSON (see text_diff.py)
+    output: str = "text"
 
 class RegisterRequest(BaseModel):
     email: EmailStr
@@ -64,6 +111,22 @@ class GlossaryItemRequest(BaseModel):
     target: str
     category: Optional[str] = None
 
+class ChatSessionRequest(BaseModel):
+    documentId: int
+    model: str
+
+class ChatMessageRequest(BaseModel):
+    question: str
+    model: Optional[str] = None
+    apiKey: Optional[str] = None
+
+# Shared cache lifetimes (seconds). Glossary entries are keyed by collection
+# version, so the TTL only bounds how long superseded versions linger;
+# users are never edited after registration.
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+GLOSSARY_CACHE_TTL = int(os.getenv("GLOSSARY_CACHE_TTL", "600"))
+PDF_CACHE_TTL = int(os.getenv("PDF_CACHE_TTL", "86400"))
+
 # Helper: Get current user from token
 def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
     if not authorization or not authorization.startswith("Bearer "):
@@ -75,64 +138,139 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = db.query(User).filter(User.email == payload.get("sub")).first()
+    email = payload.get("sub")
+    cached = get_cache().get_json("users", email)
+    if cached is not None:
+        # Detached copy; endpoints only need the identity of the caller
+        return User(id=cached["id"], email=cached["email"], full_name=cached["full_name"])
+
+    user = db.query(User).filter(User.email == email).first()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
+    get_cache().set_json("users", email, {"id": user.id, "email": user.email, "full_name": user.full_name},
+                   USER_CACHE_TTL)
     return user
 
-GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+# Helper: Read-only session for a list endpoint (may be served by a replica)
+def user_read_db(collection: str):
+    def dependency(current_user: User = Depends(get_current_user)):
+        yield from get_read_db(current_user.id, collection)
+    return dependency
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+
+# Identical prompts (same model and API key) are answered from the shared
+# cache for this many seconds; 0 disables response caching. A hash of the
+# key is part of the cache key, so answers paid for with one key are never
+# served to a caller using another (or an invalid) key.
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "0"))
 
 async def generate_gemini_content(prompt: str, model_name: str, api_key: str) -> str:
-    target_model = "gemini-1.5-pro" if "pro" in model_name else "gemini-1.5-flash"
+    target_model = resolve_model(model_name)
+    cache_key = None
+    if LLM_CACHE_TTL > 0:
+        key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        cache_key = hashlib.sha256(f"{key_id}\n{target_model}\n{prompt}".encode("utf-8")).hexdigest()
+        cached = await run_in_threadpool(get_cache().get, "llm_response", cache_key)
+        if cached is not None:
+            return cached.decode("utf-8")
     url = f"{GEMINI_BASE_URL}/{target_model}:generateContent?key={api_key}"
     
     payload = {
         "contents": [{"parts": [{"text": prompt}]}]
     }
     
+    start = time.perf_counter()
     async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, timeout=60.0)
+        try:
+            response = await client.post(url, json=payload, timeout=60.0)
+        except httpx.HTTPError:
+            metrics.GEMINI_RESPONSES.inc(model=target_model, status="error")
+            raise
+        elapsed = time.perf_counter() - start
+        metrics.GEMINI_RESPONSES.inc(model=target_model, status=response.status_code)
+        metrics.GEMINI_REQUEST_DURATION.observe(elapsed, model=target_model, mode="generate")
         if response.status_code != 200:
             raise Exception(f"Gemini API Error: {response.text}")
         
         data = response.json()
         try:
-            return data["candidates"][0]["content"]["parts"][0]["text"]
+            text = data["candidates"][0]["content"]["parts"][0]["text"]
         except (KeyError, IndexError):
             return ""
+        if elapsed > 0:
+            metrics.GEMINI_TOKENS_PER_SECOND.observe(
+                estimate_tokens(text, target_model) / elapsed, model=target_model, mode="generate")
+        if cache_key is not None and text:
+            await run_in_threadpool(get_cache().set, "llm_response", cache_key, text.encode("utf-8"), LLM_CACHE_TTL)
+        return text
 
 async def stream_gemini_content(prompt: str, model_name: str, api_key: str):
-    target_model = "gemini-1.5-pro" if "pro" in model_name else "gemini-1.5-flash"
+    target_model = resolve_model(model_name)
     url = f"{GEMINI_BASE_URL}/{target_model}:streamGenerateContent?alt=sse&key={api_key}"
     
     payload = {
         "contents": [{"parts": [{"text": prompt}]}]
     }
     
-    async with httpx.AsyncClient() as client:
-        async with client.stream("POST", url, json=payload, timeout=60.0) as response:
-            if response.status_code != 200:
-                error_text = await response.read()
-                raise Exception(f"Gemini API Error: {error_text.decode()}")
-            
-            async for line in response.aiter_lines():
-                if line.startswith("data: "):
-                    json_str = line[6:]
-                    try:
-                        data = json.loads(json_str)
-                        text = data["candidates"][0]["content"]["parts"][0]["text"]
+    start = time.perf_counter()
+    first_token_at = None
+    output_tokens = 0
+    status = "error"
+    metrics.GEMINI_STREAMS_IN_FLIGHT.inc()
+    try:
+        async with httpx.AsyncClient() as client:
+            async with client.stream("POST", url, json=payload, timeout=60.0) as response:
+                status = response.status_code
+                if response.status_code != 200:
+                    error_text = await response.read()
+                    raise Exception(f"Gemini API Error: {error_text.decode()}")
+                
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        json_str = line[6:]
+                        try:
+                            data = json.loads(json_str)
+                            text = data["candidates"][0]["content"]["parts"][0]["text"]
+                        except:
+                            continue
                         if text:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                metrics.GEMINI_TIME_TO_FIRST_TOKEN.observe(
+                                    first_token_at - start, model=target_model)
+                            output_tokens += estimate_tokens(text, target_model)
                             yield text
-                    except:
-                        pass
+    finally:
+        end = time.perf_counter()
+        metrics.GEMINI_STREAMS_IN_FLIGHT.dec()
+        metrics.GEMINI_RESPONSES.inc(model=target_model, status=status)
+        metrics.GEMINI_REQUEST_DURATION.observe(end - start, model=target_model, mode="stream")
+        if first_token_at is not None and end > first_token_at:
+            metrics.GEMINI_TOKENS_PER_SECOND.observe(
+                output_tokens / (end - first_token_at), model=target_model, mode="stream")
+
+async def stream_edit_operations(original: str, chunks):
+    """Turn a stream of polished text into NDJSON edit operations.
+
+    Each paragraph is diffed (word-level Myers) as soon as it is complete.
+    Every line is {"op", "start", "end", "text"} with offsets into the
+    original text, followed by a final {"op": "done", "edits": n}.
+    """
+    differ = ParagraphDiffer(original)
+    # Diffing is CPU-bound, so it runs in the threadpool, not the event loop
+    async for chunk in chunks:
+        for edit in await run_in_threadpool(differ.feed, chunk):
+            yield json.dumps(edit, ensure_ascii=False) + "\n"
+    for edit in await run_in_threadpool(differ.finish):
+        yield json.dumps(edit, ensure_ascii=False) + "\n"
+    yield json.dumps({"op": "done", "edits": differ.edit_count}) + "\n"
 
 # ===== Authentication Endpoints =====
 
 from email_validator import validate_email, EmailNotValidError
 
-# ... (keep existing imports)
-
 @app.post("/api/register")
 async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     """Register a new user"""
@@ -196,18 +334,66 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
 # Helper: Get relevant glossary terms
 def get_relevant_glossary_terms(text: str, user_id: int, db: Session) -> str:
     """Find glossary terms that appear in the text"""
-    terms = db.query(GlossaryTerm).filter(GlossaryTerm.user_id == user_id).all()
+    # Keyed by collection version, like the list endpoints' bodies: any
+    # change to the glossary bumps the version, so no instance can serve or
+    # repopulate a stale entry and nothing needs deleting
+    key = f"{user_id}:{get_collection_version(db, user_id, 'glossary')}"
+    terms = get_cache().get_json("glossary", key)
+    if terms is None:
+        rows = db.query(GlossaryTerm).filter(GlossaryTerm.user_id == user_id).all()
+        terms = [[t.source, t.target] for t in rows]
+        get_cache().set_json("glossary", key, terms, GLOSSARY_CACHE_TTL)
     relevant_terms = []
     
-    for term in terms:
-        if term.source.lower() in text.lower():
-            relevant_terms.append(f"{term.source} -> {term.target}")
+    lowered = text.lower()
+    for source, target in terms:
+        if source.lower() in lowered:
+            relevant_terms.append(f"{source} -> {target}")
             
     if not relevant_terms:
         return ""
         
     return "\n".join(relevant_terms)
 
+# Helper: Extract text from each page of a PDF
+def extract_pdf_pages(content: bytes) -> List[str]:
+    """Return the extracted text of every page, timing each page.
+
+    Results are cached by content hash, so re-uploading the same PDF on any
+    worker skips extraction.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    pages = get_cache().get_json("pdf_pages", digest)
+    if pages is not None:
+        return pages
+
+    import pypdf
+    reader = pypdf.PdfReader(io.BytesIO(content))
+    pages = []
+    for page in reader.pages:
+        with metrics.PDF_PAGE_EXTRACT_DURATION.time():
+            pages.append(page.extract_text() or "")
+    get_cache().set_json("pdf_pages", digest, pages, PDF_CACHE_TTL)
+    return pages
+
+# Helper: Extract plain text from an uploaded document
+def extract_document_text(content: bytes, file_type: str) -> str:
+    if file_type == 'pdf':
+        return "".join(p + "\n" for p in extract_pdf_pages(content) if p)
+    if file_type in ('txt', 'md'):
+        return content.decode('utf-8', errors='ignore')
+    return ""
+
+# Helper: Report the estimated prompt size for a request
+def report_prompt(endpoint: str, built: BuiltPrompt) -> dict:
+    """Log the prompt estimate and return headers exposing it to the client"""
+    trimmed = f" (trimmed: {', '.join(built.trimmed)})" if built.trimmed else ""
+    print(f"[INFO] {endpoint}: ~{built.estimated_tokens}/{built.budget} tokens for {built.model}{trimmed}")
+    return {
+        "X-Prompt-Tokens": str(built.estimated_tokens),
+        "X-Prompt-Budget": str(built.budget),
+    }
+
 class TranslateRequest(BaseModel):
     text: str
     targetLang: str
@@ -226,29 +412,51 @@ async def polish_text(
     if not api_key:
         raise HTTPException(status_code=401, detail="API Key is required. Please provide it in the UI or set GEMINI_API_KEY in backend/.env")
     
+    if request.output not in ("text", "edits"):
+        raise HTTPException(status_code=400, detail="output must be 'text' or 'edits'")
+    
     # Try to get user for glossary (optional)
     glossary_context = ""
     try:
         if authorization:
-            user = get_current_user(authorization, db)
-            terms = get_relevant_glossary_terms(request.text, user.id, db)
+            user = await run_in_threadpool(get_current_user, authorization, db)
+            terms = await run_in_threadpool(get_relevant_glossary_terms, request.text, user.id, db)
             if terms:
                 glossary_context = f"\n\nUse the following glossary terms:\n{terms}"
     except:
         pass # Ignore auth errors for polish, just skip glossary
+    
+    # Edits are diffed paragraph by paragraph, so ask for the same layout
+    structure = ""
+    if request.output == "edits":
+        structure = "\n        Keep the original paragraph breaks and return only the polished text, one paragraph per line."
 
     try:
-        prompt = f"""
+        built = PromptBuilder(request.model) \
+            .add("structure", structure) \
+            .add("glossary", glossary_context, strategy="lines") \
+            .add("text", request.text) \
+            .build("""
         Please polish the following academic text to make it more professional, clear, and concise. 
-        Maintain the original meaning but improve the flow and vocabulary.{glossary_context}
+        Maintain the original meaning but improve the flow and vocabulary.{structure}{glossary}
         
         Text to polish:
-        {request.text}
-        """
+        {text}
+        """)
+        headers = report_prompt("polish", built)
+        
+        chunks = stream_gemini_content(built.text, request.model, api_key)
+        if request.output == "edits":
+            return StreamingResponse(
+                stream_edit_operations(request.text, chunks),
+                media_type="application/x-ndjson",
+                headers=headers
+            )
         
         return StreamingResponse(
-            stream_gemini_content(prompt, request.model, api_key), 
-            media_type="text/plain"
+            chunks, 
+            media_type="text/plain",
+            headers=headers
         )
         
     except Exception as e:
@@ -270,25 +478,31 @@ async def translate_text(
     glossary_context = ""
     try:
         if authorization:
-            user = get_current_user(authorization, db)
-            terms = get_relevant_glossary_terms(request.text, user.id, db)
+            user = await run_in_threadpool(get_current_user, authorization, db)
+            terms = await run_in_threadpool(get_relevant_glossary_terms, request.text, user.id, db)
             if terms:
                 glossary_context = f"\n\nUse the following glossary terms:\n{terms}"
     except:
         pass 
 
     try:
-        prompt = f"""
-        Please translate the following academic text to {request.targetLang}.
-        Ensure accuracy and academic tone.{glossary_context}
+        built = PromptBuilder(request.model) \
+            .add("target_lang", request.targetLang) \
+            .add("glossary", glossary_context, strategy="lines") \
+            .add("text", request.text) \
+            .build("""
+        Please translate the following academic text to {target_lang}.
+        Ensure accuracy and academic tone.{glossary}
         
         Text to translate:
-        {request.text}
-        """
+        {text}
+        """)
+        headers = report_prompt("translate", built)
         
         return StreamingResponse(
-            stream_gemini_content(prompt, request.model, api_key), 
-            media_type="text/plain"
+            stream_gemini_content(built.text, request.model, api_key), 
+            media_type="text/plain",
+            headers=headers
         )
         
     except Exception as e:
@@ -296,6 +510,7 @@ async def translate_text(
 
 @app.post("/api/analyze-upload")
 async def analyze_upload(
+    response: Response,
     file: UploadFile = File(...),
     model: str = Form(...),
     apiKey: Optional[str] = Form(None)
@@ -307,8 +522,6 @@ async def analyze_upload(
         raise HTTPException(status_code=401, detail="API Key is required. Please provide it in the UI or set GEMINI_API_KEY in backend/.env")
 
     try:
-        import pypdf
-        
         # Read file content
         content = await file.read()
         full_text = ""
@@ -317,14 +530,9 @@ async def analyze_upload(
         # Parse PDF content
         if file.filename.endswith('.pdf'):
             try:
-                pdf_file = io.BytesIO(content)
-                reader = pypdf.PdfReader(pdf_file)
-                pages_analyzed = len(reader.pages)
-                
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        full_text += page_text + "\n\n"
+                pages = await run_in_threadpool(extract_pdf_pages, content)
+                pages_analyzed = len(pages)
+                full_text = "".join(p + "\n\n" for p in pages if p)
                 
                 print(f"[INFO] Extracted {len(full_text)} characters from {pages_analyzed} pages")
             except Exception as pdf_error:
@@ -343,17 +551,24 @@ async def analyze_upload(
             raise HTTPException(status_code=400, detail="No text content found in the document.")
         
         # Create comprehensive review prompt
-        prompt = f"""You are an expert reviewer for top-tier academic journals (e.g., Nature, Science, IEEE).
+        # The document is trimmed to the model's token budget, keeping both the
+        # opening sections and the conclusions rather than a fixed char slice
+        built = PromptBuilder(model) \
+            .add("char_count", str(len(full_text))) \
+            .add("word_count", str(len(full_text.split()))) \
+            .add("page_count", str(pages_analyzed)) \
+            .add("document", full_text, strategy="head_tail") \
+            .build("""You are an expert reviewer for top-tier academic journals (e.g., Nature, Science, IEEE).
 
 Please review this academic paper comprehensively:
 
 Document Statistics:
-- Total Characters: {len(full_text)}
-- Total Words: {len(full_text.split())}
-- Total Pages: {pages_analyzed}
+- Total Characters: {char_count}
+- Total Words: {word_count}
+- Total Pages: {page_count}
 
 Full Document Content:
-{full_text[:100000]}
+{document}
 
 Please provide:
 1. Overall Score (0-100)
@@ -364,10 +579,11 @@ Please provide:
    - Language & Structure
 3. Specific improvement suggestions with line/section references
 
-Confirm you have read the ENTIRE document by mentioning specific content from different sections."""
+Confirm you have read the ENTIRE document by mentioning specific content from different sections.""")
+        response.headers.update(report_prompt("analyze-upload", built))
         
         # Generate AI review
-        review_text = await generate_gemini_content(prompt, model, final_api_key)
+        review_text = await generate_gemini_content(built.text, model, final_api_key)
         
         # Extract score (basic pattern matching - improve in production)
         score = 85  # Default if not found
@@ -385,7 +601,8 @@ Confirm you have read the ENTIRE document by mentioning specific content from di
             "diffs": [],  # You can enhance this to extract specific suggestions
             "metadata": {
                 "filename": file.filename,
-                "model_used": target_model,
+                "model_used": built.model,
+                "prompt_tokens": built.estimated_tokens,
                 "analysis_complete": True
             }
         }
@@ -400,6 +617,7 @@ Confirm you have read the ENTIRE document by mentioning specific content from di
 
 @app.post("/api/chat-doc")
 async def chat_doc(
+    response: Response,
     file: Optional[UploadFile] = File(None),
     question: str = Form(...),
     model: str = Form(...),
@@ -413,58 +631,212 @@ async def chat_doc(
     try:
         context_text = ""
         if file:
-            import pypdf
             content = await file.read()
             if file.filename.endswith('.pdf'):
                 try:
-                    pdf_file = io.BytesIO(content)
-                    reader = pypdf.PdfReader(pdf_file)
-                    for page in reader.pages:
-                        text = page.extract_text()
-                        if text:
-                            context_text += text + "\n"
+                    pages = await run_in_threadpool(extract_pdf_pages, content)
+                    context_text = "".join(p + "\n" for p in pages if p)
                 except Exception as e:
                     print(f"PDF Error: {e}")
             elif file.filename.endswith(('.txt', '.md')):
                 context_text = content.decode('utf-8', errors='ignore')
         
-        # Construct prompt
-        prompt = f"""
+        # Construct prompt (context is trimmed to the model's token budget)
+        built = PromptBuilder(model) \
+            .add("question", question) \
+            .add("context", context_text, strategy="head") \
+            .build("""
         You are an intelligent academic assistant. 
         
         Context from document:
-        {context_text[:50000]}  # Limit context size
+        {context}
         
         User Question: {question}
         
         Please answer the question based on the provided document context. If the answer is not in the context, use your general knowledge but mention that it's not in the document.
-        """
+        """)
+        response.headers.update(report_prompt("chat-doc", built))
         
-        return await generate_gemini_content(prompt, model, final_api_key)
+        return await generate_gemini_content(built.text, model, final_api_key)
 
     except Exception as e:
         print(f"ChatDoc Error: {e}")
         return f"Error: {str(e)}"
 
+# ===== Chat Session Endpoints =====
+
+async def load_reference_text(doc: ReferenceDocument, db: Session) -> str:
+    """Stored text of a reference document, extracting it on first use"""
+    stored = db.get(ReferenceText, doc.id)
+    if stored:
+        return stored.text
+    
+    # Documents uploaded before texts were stored: fetch and parse once
+    content = None
+    if doc.file_path.startswith("http") and "mock=true" not in doc.file_path:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(doc.file_path, timeout=60.0)
+            if response.status_code == 200:
+                content = response.content
+    elif os.path.exists(doc.file_path):
+        with open(doc.file_path, "rb") as f:
+            content = f.read()
+    if content is None:
+        return ""
+    
+    text = await run_in_threadpool(extract_document_text, content, doc.file_type)
+    if text.strip():
+        db.add(ReferenceText(document_id=doc.id, text=text))
+        db.commit()
+    return text
+
+async def resume_chat_session(session_id: str, user_id: int, db: Session):
+    """Load a session's state from the database, reusing this process's copy
+    when it is current. Returns (session, record) or (None, None)."""
+    record = db.get(ChatSessionRecord, session_id)
+    if record is None or record.user_id != user_id:
+        return None, None
+    if record.last_used < datetime.utcnow() - timedelta(seconds=CHAT_SESSION_IDLE_SECONDS):
+        db.delete(record)
+        db.commit()
+        chat_sessions.remove(session_id, user_id)
+        return None, None
+
+    session = chat_sessions.get(session_id, user_id)
+    if session is None or session.turn_count != record.turn_count:
+        # First message on this instance, or another instance answered since
+        doc = db.get(ReferenceDocument, record.document_id)
+        if doc is None:
+            return None, None
+        text = await load_reference_text(doc, db)
+        session = chat_sessions.add(ChatSession.restore(record, doc.filename, text))
+    return session, record
+
+@app.post("/api/chat-sessions")
+async def create_chat_session(
+    request: ChatSessionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Start a conversation about a stored reference document"""
+    doc = db.query(ReferenceDocument).filter(ReferenceDocument.id == request.documentId, ReferenceDocument.user_id == current_user.id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    try:
+        text = await load_reference_text(doc, db)
+    except Exception as e:
+        print(f"[ERROR] Loading document {doc.id} failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Could not load document: {str(e)}")
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="No text content found in the document.")
+    
+    session = chat_sessions.add(ChatSession(current_user.id, doc.id, doc.filename, text, request.model))
+    db.query(ChatSessionRecord).filter(
+        ChatSessionRecord.last_used < datetime.utcnow() - timedelta(seconds=CHAT_SESSION_IDLE_SECONDS)
+    ).delete(synchronize_session=False)
+    db.add(ChatSessionRecord(id=session.id, user_id=current_user.id, document_id=doc.id, model=request.model))
+    db.commit()
+    return {
+        "sessionId": session.id,
+        "documentId": str(doc.id),
+        "filename": doc.filename,
+        "characterCount": session.character_count,
+        "contextTruncated": len(session.context) < session.character_count
+    }
+
+@app.post("/api/chat-sessions/{session_id}/messages")
+async def send_chat_message(
+    session_id: str,
+    request: ChatMessageRequest,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Ask a follow-up question; only the question is sent, context lives on the server"""
+    session, _ = await resume_chat_session(session_id, current_user.id, db)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    expected_turns = session.turn_count
+    
+    final_api_key = request.apiKey or os.getenv("GEMINI_API_KEY")
+    if not final_api_key:
+        raise HTTPException(status_code=401, detail="API Key is required")
+    
+    model = request.model or session.model
+    built = PromptBuilder(model) \
+        .add("filename", session.filename) \
+        .add("summary", session.summary) \
+        .add("history", session.history) \
+        .add("question", request.question) \
+        .add("context", session.context, strategy="head") \
+        .build(CHAT_PROMPT_TEMPLATE)
+    response.headers.update(report_prompt("chat-session", built))
+    
+    try:
+        answer = await generate_gemini_content(built.text, model, final_api_key)
+    except Exception as e:
+        print(f"ChatSession Error: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    # Only store the turn if no other request answered in the meantime,
+    # otherwise one of the two answers would silently be lost
+    state = session.next_state(request.question, answer)
+    result = db.execute(
+        update(ChatSessionRecord)
+        .where(ChatSessionRecord.id == session_id, ChatSessionRecord.turn_count == expected_turns)
+        .values(**state, last_used=datetime.utcnow())
+    )
+    db.commit()
+    if result.rowcount == 0:
+        chat_sessions.remove(session_id, current_user.id)
+        raise HTTPException(status_code=409, detail="Chat session was updated concurrently; retry the question")
+    session.apply(state)
+    return {
+        "answer": answer,
+        "turns": state["turn_count"],
+        "promptTokens": built.estimated_tokens
+    }
+
+@app.delete("/api/chat-sessions/{session_id}")
+async def delete_chat_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """End a conversation and free its memory"""
+    chat_sessions.remove(session_id, current_user.id)
+    record = db.get(ChatSessionRecord, session_id)
+    if record is None or record.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    db.delete(record)
+    db.commit()
+    return {"success": True}
+
 # ===== Glossary Endpoints =====
 
 @app.get("/api/glossary")
 async def get_glossary(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(user_read_db("glossary")),
     current_user: User = Depends(get_current_user)
 ):
     """Get all glossary terms for current user"""
-    terms = db.query(GlossaryTerm).filter(GlossaryTerm.user_id == current_user.id).order_by(GlossaryTerm.created_at.desc()).all()
-    return [
-        {
-            "id": str(t.id),
-            "source": t.source,
-            "target": t.target,
-            "category": t.category,
-            "createdAt": t.created_at.isoformat()
-        }
-        for t in terms
-    ]
+    def build():
+        terms = db.query(GlossaryTerm).filter(GlossaryTerm.user_id == current_user.id).order_by(GlossaryTerm.created_at.desc()).all()
+        return [
+            {
+                "id": str(t.id),
+                "source": t.source,
+                "target": t.target,
+                "category": t.category,
+                "createdAt": t.created_at.isoformat()
+            }
+            for t in terms
+        ]
+    
+    version = get_collection_version(db, current_user.id, "glossary")
+    return await run_in_threadpool(versioned_json_response, request, current_user.id, "glossary", version, build)
 
 @app.post("/api/glossary")
 async def add_glossary_term(
@@ -509,21 +881,26 @@ async def delete_glossary_term(
 
 @app.get("/api/references")
 async def get_references(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(user_read_db("references")),
     current_user: User = Depends(get_current_user)
 ):
     """Get all reference documents for current user"""
-    docs = db.query(ReferenceDocument).filter(ReferenceDocument.user_id == current_user.id).order_by(ReferenceDocument.upload_date.desc()).all()
-    return [
-        {
-            "id": str(d.id),
-            "filename": d.filename,
-            "fileType": d.file_type,
-            "uploadDate": d.upload_date.isoformat(),
-            "size": "Unknown" # In a real app, store size
-        }
-        for d in docs
-    ]
+    def build():
+        docs = db.query(ReferenceDocument).filter(ReferenceDocument.user_id == current_user.id).order_by(ReferenceDocument.upload_date.desc()).all()
+        return [
+            {
+                "id": str(d.id),
+                "filename": d.filename,
+                "fileType": d.file_type,
+                "uploadDate": d.upload_date.isoformat(),
+                "size": "Unknown" # In a real app, store size
+            }
+            for d in docs
+        ]
+    
+    version = get_collection_version(db, current_user.id, "references")
+    return await run_in_threadpool(versioned_json_response, request, current_user.id, "references", version, build)
 
 @app.post("/api/references/upload")
 async def upload_reference(
@@ -548,6 +925,15 @@ async def upload_reference(
     if file_type not in ['pdf', 'txt', 'md']:
         file_type = 'other'
 
+    # Keep the extracted text so chat sessions can use the document later.
+    # Parsing happens before any row is written so no transaction is held
+    # open while it runs.
+    try:
+        text = await run_in_threadpool(extract_document_text, content, file_type)
+    except Exception as e:
+        print(f"[WARNING] Text extraction failed for {file.filename}: {e}")
+        text = ""
+    
     # Save to DB
     new_doc = ReferenceDocument(
         user_id=current_user.id,
@@ -556,6 +942,9 @@ async def upload_reference(
         file_type=file_type
     )
     db.add(new_doc)
+    if text.strip():
+        db.flush()
+        db.add(ReferenceText(document_id=new_doc.id, text=text))
     db.commit()
     db.refresh(new_doc)
     
@@ -590,8 +979,11 @@ async def delete_reference(
         except Exception as e:
             print(f"Error deleting local file: {e}")
     
+    db.query(ReferenceText).filter(ReferenceText.document_id == doc.id).delete()
+    db.query(ChatSessionRecord).filter(ChatSessionRecord.document_id == doc.id).delete()
     db.delete(doc)
     db.commit()
+    chat_sessions.remove_document(doc.id)
     return {"success": True}
 
 # ===== User Data Endpoints =====
@@ -620,27 +1012,33 @@ async def save_history(
 
 @app.get("/api/history")
 async def get_history(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(user_read_db("history")),
     current_user: User = Depends(get_current_user)
 ):
     """Get all history records for the current user"""
-    records = db.query(HistoryRecord).filter(
-        HistoryRecord.user_id == current_user.id
-    ).order_by(HistoryRecord.created_at.desc()).all()
+    def build():
+        records = db.query(HistoryRecord).filter(
+            HistoryRecord.user_id == current_user.id
+        ).order_by(HistoryRecord.created_at.desc()).all()
+        
+        return {
+            "records": [
+                {
+                    "id": r.id,
+                    "type": r.type,
+                    "title": r.title,
+                    "date": r.created_at.isoformat(),
+                    "score": r.score,
+                    "words": r.words
+                }
+                for r in records
+            ]
+        }
     
-    return {
-        "records": [
-            {
-                "id": r.id,
-                "type": r.type,
-                "title": r.title,
-                "date": r.created_at.isoformat(),
-                "score": r.score,
-                "words": r.words
-            }
-            for r in records
-        ]
-    }
+    version = get_collection_version(db, current_user.id, "history")
+    return await run_in_threadpool(versioned_json_response, request, current_user.id, "history", version, build)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("backend_server:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,78 @@
+"""Import-time (cold start) profiling report for the backend.
+
+Imports `backend_server` in a fresh interpreter with `-X importtime`, then
+prints the total import time, the slowest top-level packages, and whether any
+module that is supposed to load lazily was imported at startup.
+
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --max-ms 1500 --top 15
+
+Exits with status 1 if the import exceeds --max-ms or a lazy module leaked
+into startup, so it can guard against cold-start regressions in CI.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported on first use. email_validator and bcrypt
+# are not listed: fastapi.openapi and cryptography (via jose) import them.
+LAZY_MODULES = ("pypdf", "passlib", "uvicorn")
+
+def profile_imports(module: str = "backend_server") -> List[Tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) for every import in import order"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def summarize(rows: List[Tuple[str, int, int]], module: str) -> Tuple[int, Dict[str, int]]:
+    total = next((cum for name, _, cum in rows if name == module), 0)
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    return total, by_package
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import profiling report")
+    parser.add_argument("--module", default="backend_server")
+    parser.add_argument("--top", type=int, default=10, help="number of packages to list")
+    parser.add_argument("--max-ms", type=float, help="fail if the import takes longer than this")
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total, by_package = summarize(rows, args.module)
+
+    print(f"Import of {args.module}: {total / 1000:.1f} ms ({len(rows)} modules)\n")
+    print(f"{'package':<28}{'self ms':>10}{'share':>8}")
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        share = us / total if total else 0
+        print(f"{package:<28}{us / 1000:>10.1f}{share:>8.0%}")
+
+    status = 0
+    imported = {name.split(".")[0] for name, _, _ in rows}
+    leaked = [m for m in LAZY_MODULES if m in imported]
+    if leaked:
+        print(f"\n[ERROR] Lazily loaded modules imported at startup: {', '.join(leaked)}")
+        status = 1
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        print(f"\n[ERROR] Import took {total / 1000:.1f} ms, budget is {args.max_ms:.0f} ms")
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
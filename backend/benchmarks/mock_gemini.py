@@ -0,0 +1,84 @@
+"""Local stand-in for the Gemini REST API, used by the benchmark suite.
+
+Implements `{model}:generateContent` and `{model}:streamGenerateContent?alt=sse`
+with a configurable time-to-first-token and output token rate, so load tests
+exercise the backend's streaming path without network access or API costs.
+
+Run standalone:
+    python benchmarks/mock_gemini.py --port 8100 --latency 0.2 --tokens-per-second 200
+and point the backend at it with
+    GEMINI_BASE_URL=http://127.0.0.1:8100/v1beta/models
+"""
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("the results indicate that the proposed method improves accuracy while "
+         "reducing computational cost across all evaluated datasets").split()
+
+def _text(n_tokens: int) -> str:
+    # One word is treated as one token
+    return " ".join(WORDS[i % len(WORDS)] for i in range(n_tokens))
+
+def _chunk(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+def create_app(latency: float = 0.2, tokens_per_second: float = 200.0,
+               output_tokens: int = 300, chunk_tokens: int = 8,
+               error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    def check_error():
+        app.state.requests += 1
+        if error_rate and random.random() < error_rate:
+            raise HTTPException(status_code=503, detail="mock upstream overloaded")
+
+    @app.post("/v1beta/models/{model_action}")
+    async def model_action(model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        await request.body()
+        check_error()
+
+        if action == "generateContent":
+            await asyncio.sleep(latency + output_tokens / tokens_per_second)
+            body = _chunk("Overall Score: 87\n\n" + _text(output_tokens))
+            body["usageMetadata"] = {"candidatesTokenCount": output_tokens}
+            return JSONResponse(body)
+
+        if action == "streamGenerateContent":
+            async def events():
+                await asyncio.sleep(latency)
+                sent = 0
+                while sent < output_tokens:
+                    n = min(chunk_tokens, output_tokens - sent)
+                    yield f"data: {json.dumps(_chunk(_text(n) + ' '))}\r\n\r\n"
+                    sent += n
+                    await asyncio.sleep(n / tokens_per_second)
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        raise HTTPException(status_code=404, detail=f"Unknown action: {action}")
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds until the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--output-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.tokens_per_second, args.output_tokens,
+                     error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
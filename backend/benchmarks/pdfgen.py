@@ -0,0 +1,56 @@
+"""Generate simple text PDFs for extraction benchmarks (no extra dependencies)."""
+from typing import Optional
+
+PARAGRAPH = ("Deep learning models have achieved remarkable performance on a wide range of "
+             "tasks. In this section we describe the experimental setup, the datasets and the "
+             "evaluation protocol used to compare the proposed approach against baselines.")
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: int = 10, lines_per_page: int = 40, doc_id: Optional[str] = None) -> bytes:
+    """Build a PDF with `pages` pages of Helvetica text.
+
+    PDFs with different `doc_id`s have the same text but different bytes,
+    so each one misses the backend's extracted-text cache.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    info = ""
+    if doc_id is not None:
+        objects.append(f"<< /Title ({_escape(doc_id)}) >>".encode("latin-1"))
+        info = f" /Info {len(objects)} 0 R"
+    page_ids = []
+    words = PARAGRAPH.split()
+    for p in range(pages):
+        lines = []
+        for i in range(lines_per_page):
+            start = (p * lines_per_page + i) % len(words)
+            line = " ".join((words * 2)[start:start + 12])
+            lines.append(f"({_escape(line)}) Tj T*")
+        stream = ("BT /F1 10 Tf 12 TL 50 780 Td\n" + "\n".join(lines) + "\nET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1"))
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R%s >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, info.encode("latin-1"), xref)
+    return bytes(out)
@@ -0,0 +1,153 @@
+"""Local stand-in for a Redis server, for exercising cache.RedisCache offline.
+
+Speaks enough RESP2 for the cache tier: PING, AUTH, SELECT, GET, SET (EX/PX),
+DEL, SCAN, DBSIZE, INFO, FLUSHDB, PUBLISH and SUBSCRIBE. Data lives in memory
+and is not persisted.
+
+    python benchmarks/redis_standin.py --port 6399
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6399/0 python backend_server.py
+"""
+import argparse
+import asyncio
+import fnmatch
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    if isinstance(value, Exception):
+        return b"-ERR %s\r\n" % str(value).encode()
+    raise TypeError(type(value))
+
+class RedisStandIn:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+
+    def _alive(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                reply = self.dispatch(args, writer)
+                if reply is not _NO_REPLY:
+                    writer.write(_encode(reply))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in self.channels.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # inline command
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def dispatch(self, args: List[bytes], writer: asyncio.StreamWriter):
+        command = args[0].upper()
+        if command == b"PING":
+            return "PONG"
+        if command in (b"AUTH", b"SELECT"):
+            return "OK"
+        if command == b"GET":
+            return self._alive(args[1])
+        if command == b"SET":
+            expires = None
+            options = [a.upper() for a in args[3:]]
+            if b"PX" in options:
+                expires = time.time() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires = time.time() + int(args[3 + options.index(b"EX") + 1])
+            self.data[args[1]] = (args[2], expires)
+            return "OK"
+        if command == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                if self._alive(key) is not None:
+                    del self.data[key]
+                    removed += 1
+            return removed
+        if command == b"SCAN":
+            pattern = b"*"
+            if b"MATCH" in [a.upper() for a in args]:
+                pattern = args[[a.upper() for a in args].index(b"MATCH") + 1]
+            keys = [k for k in list(self.data) if self._alive(k) is not None
+                    and fnmatch.fnmatchcase(k.decode(), pattern.decode())]
+            return [b"0", keys]
+        if command == b"DBSIZE":
+            return sum(1 for k in list(self.data) if self._alive(k) is not None)
+        if command == b"INFO":
+            used = sum(len(k) + len(v) for k, (v, _) in self.data.items())
+            return f"# Memory\r\nused_memory:{used}\r\n".encode()
+        if command == b"FLUSHDB":
+            self.data.clear()
+            return "OK"
+        if command == b"PUBLISH":
+            subscribers = self.channels.get(args[1], set())
+            for subscriber in subscribers:
+                subscriber.write(_encode([b"message", args[1], args[2]]))
+            return len(subscribers)
+        if command == b"SUBSCRIBE":
+            for i, channel in enumerate(args[1:], start=1):
+                self.channels.setdefault(channel, set()).add(writer)
+                writer.write(_encode([b"subscribe", channel, i]))
+            return _NO_REPLY
+        return Exception(f"unknown command '{command.decode()}'")
+
+_NO_REPLY = object()
+
+async def serve(host: str, port: int, ready: Optional[threading.Event] = None):
+    standin = RedisStandIn()
+    server = await asyncio.start_server(standin.handle, host, port)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+def start_in_thread(port: int, host: str = "127.0.0.1") -> threading.Thread:
+    """Run the stand-in in a daemon thread and wait until it accepts connections"""
+    ready = threading.Event()
+    thread = threading.Thread(target=lambda: asyncio.run(serve(host, port, ready)), daemon=True)
+    thread.start()
+    ready.wait(5)
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
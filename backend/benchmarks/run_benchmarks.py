@@ -0,0 +1,324 @@
+"""Offline benchmark and load-test suite for the backend.
+
+Starts a local mock Gemini server and the backend (against a throwaway SQLite
+database), then runs:
+
+- load scenarios for /api/polish, /api/translate, /api/chat-doc and
+  /api/analyze-upload at a fixed concurrency
+- micro-benchmarks for get_relevant_glossary_terms, PDF text extraction
+  (cold and cached) and get/set on the shared cache tier
+
+Each result reports throughput and p50/p95/p99 latency. Results can be saved
+as a baseline and later runs compared against it; a regression beyond the
+tolerance makes the script exit with status 1.
+
+    python benchmarks/run_benchmarks.py --requests 100 --concurrency 10
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --tolerance 0.25
+    python benchmarks/run_benchmarks.py --only micro.cache --cache-backend redis
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_gemini import create_app as create_mock_gemini
+from pdfgen import make_pdf
+import redis_standin
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+SAMPLE_TEXT = ("Deep learning has been widely used in medical image segmentation. However, the "
+               "annotation cost is high and domain shift between hospitals remains a problem. ") * 20
+
+# ===== Helpers =====
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class ServerThread:
+    """Run an ASGI app with uvicorn in a background thread"""
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+# ===== Load Scenarios =====
+
+async def run_load(send: Callable, requests: int, concurrency: int) -> Dict[str, float]:
+    """Call `send(client)` `requests` times with at most `concurrency` in flight"""
+    latencies: List[float] = []
+    errors = 0
+    queue = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        for _ in queue:
+            start = time.perf_counter()
+            try:
+                ok = await send(client)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, elapsed, errors)
+
+def load_scenarios(base_url: str, token: str, requests: int, pdf_pages: int) -> Dict[str, Callable]:
+    auth = {"Authorization": f"Bearer {token}"}
+    # Extracted text is cached by content hash, so every upload gets its own
+    # PDF (built here, outside the timed requests) to measure real extraction
+    chat_pdfs = iter([make_pdf(pdf_pages, doc_id=f"chat-{i}") for i in range(requests)])
+    analyze_pdfs = iter([make_pdf(pdf_pages, doc_id=f"analyze-{i}") for i in range(requests)])
+
+    async def stream(client, path, body):
+        # Consume the full body so latency covers the whole stream
+        async with client.stream("POST", base_url + path, json=body, headers=auth) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response.status_code == 200
+
+    async def polish(client):
+        return await stream(client, "/api/polish", {"text": SAMPLE_TEXT, "model": "flash"})
+
+    async def translate(client):
+        return await stream(client, "/api/translate",
+                            {"text": SAMPLE_TEXT, "targetLang": "Chinese", "model": "flash"})
+
+    async def chat_doc(client):
+        response = await client.post(
+            base_url + "/api/chat-doc",
+            data={"question": "What datasets are used?", "model": "flash"},
+            files={"file": ("paper.pdf", next(chat_pdfs), "application/pdf")})
+        return response.status_code == 200 and not response.json().startswith("Error")
+
+    async def analyze_upload(client):
+        response = await client.post(
+            base_url + "/api/analyze-upload",
+            data={"model": "flash"},
+            files={"file": ("paper.pdf", next(analyze_pdfs), "application/pdf")})
+        return response.status_code == 200
+
+    return {
+        "load.polish": polish,
+        "load.translate": translate,
+        "load.chat_doc": chat_doc,
+        "load.analyze_upload": analyze_upload,
+    }
+
+# ===== Micro-benchmarks =====
+
+def run_micro(fn: Callable, iterations: int) -> Dict[str, float]:
+    fn()  # warm up
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+def micro_benchmarks(backend_server, db, user_id: int) -> Dict[str, Callable]:
+    small_pdf = make_pdf(pages=5)
+    large_pdf = make_pdf(pages=50)
+    cache = backend_server.get_cache()
+    payload = os.urandom(4096)
+
+    def uncached(namespace: str, fn: Callable) -> Callable:
+        def run():
+            cache.clear(namespace)
+            return fn()
+        return run
+
+    glossary = lambda: backend_server.get_relevant_glossary_terms(SAMPLE_TEXT, user_id, db)
+    return {
+        "micro.glossary_terms": uncached("glossary", glossary),
+        "micro.glossary_terms_cached": glossary,
+        "micro.pdf_extract_5p": uncached("pdf_pages", lambda: backend_server.extract_pdf_pages(small_pdf)),
+        "micro.pdf_extract_50p": uncached("pdf_pages", lambda: backend_server.extract_pdf_pages(large_pdf)),
+        "micro.pdf_extract_50p_cached": lambda: backend_server.extract_pdf_pages(large_pdf),
+        "micro.cache_set_4k": lambda: cache.set("bench", "blob", payload, 60),
+        "micro.cache_get_4k": lambda: cache.get("bench", "blob"),
+    }
+
+# ===== Baseline Comparison =====
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Return a description of every metric that regressed beyond tolerance"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p95"] > 0 and current["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95'] * 1000:.1f}ms > baseline {base['p95'] * 1000:.1f}ms")
+        if base["throughput"] > 0 and current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']:.1f}/s < baseline {base['throughput']:.1f}/s")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors (baseline {base.get('errors', 0)})")
+    return regressions
+
+def print_report(results: Dict[str, dict]):
+    print(f"\n{'scenario':<30}{'reqs':>7}{'errs':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<30}{r['requests']:>7}{r['errors']:>6}{r['throughput']:>10.1f}"
+              f"{r['p50'] * 1000:>10.2f}{r['p95'] * 1000:>10.2f}{r['p99'] * 1000:>10.2f}")
+
+# ===== Main =====
+
+def setup_backend(tmpdir: str, gemini_url: str, cache_backend: str):
+    """Import the backend against a temporary database and the mock Gemini server"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ["CACHE_BACKEND"] = cache_backend
+    os.environ["CACHE_SQLITE_PATH"] = os.path.join(tmpdir, "cache.db")
+    if cache_backend == "redis" and not os.getenv("CACHE_REDIS_URL"):
+        port = free_port()
+        redis_standin.start_in_thread(port)
+        os.environ["CACHE_REDIS_URL"] = f"redis://127.0.0.1:{port}/0"
+    os.environ["GEMINI_BASE_URL"] = gemini_url
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    sys.path.insert(0, BACKEND_DIR)
+    import backend_server
+    import database
+    return backend_server, database
+
+def seed_user(backend_server, database, glossary_terms: int):
+    database.init_db()
+    db = database.SessionLocal()
+    try:
+        # The load scenarios authenticate with a token, so no real hash is needed
+        user = database.User(email="bench@example.com", password_hash="!")
+        db.add(user)
+        db.commit()
+        words = SAMPLE_TEXT.split()
+        for i in range(glossary_terms):
+            source = words[i % len(words)] if i < len(words) else f"term{i}"
+            db.add(database.GlossaryTerm(user_id=user.id, source=source, target=f"译{i}"))
+        db.commit()
+        token = backend_server.create_access_token(data={"sub": user.email})
+        return user.id, token
+    finally:
+        db.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backend benchmark and load-test suite")
+    parser.add_argument("--requests", type=int, default=50, help="requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=50, help="iterations per micro-benchmark")
+    parser.add_argument("--latency", type=float, default=0.1, help="mock Gemini time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="mock Gemini output rate")
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--glossary-terms", type=int, default=500)
+    parser.add_argument("--only", help="comma-separated scenario name prefixes to run")
+    parser.add_argument("--cache-backend", choices=["memory", "sqlite", "redis"], default="memory",
+                        help="shared cache tier; redis uses CACHE_REDIS_URL or a local stand-in")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help=f"write results as the new baseline (default {DEFAULT_BASELINE})")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    selected = [p.strip() for p in args.only.split(",")] if args.only else None
+    wanted = lambda name: selected is None or any(name.startswith(p) or name.split(".", 1)[1].startswith(p)
+                                                   for p in selected)
+
+    results: Dict[str, dict] = {}
+    mock_port, backend_port = free_port(), free_port()
+    mock_app = create_mock_gemini(args.latency, args.tokens_per_second, args.output_tokens)
+
+    with tempfile.TemporaryDirectory() as tmpdir, ServerThread(mock_app, mock_port):
+        backend_server, database = setup_backend(tmpdir, f"http://127.0.0.1:{mock_port}/v1beta/models",
+                                                 args.cache_backend)
+        user_id, token = seed_user(backend_server, database, args.glossary_terms)
+
+        with ServerThread(backend_server.app, backend_port):
+            scenarios = load_scenarios(f"http://127.0.0.1:{backend_port}", token, args.requests, pdf_pages=20)
+            for name, send in scenarios.items():
+                if wanted(name):
+                    print(f"[INFO] Running {name} ({args.requests} requests, concurrency {args.concurrency})")
+                    results[name] = asyncio.run(run_load(send, args.requests, args.concurrency))
+
+        db = database.SessionLocal()
+        try:
+            for name, fn in micro_benchmarks(backend_server, db, user_id).items():
+                if wanted(name):
+                    print(f"[INFO] Running {name} ({args.iterations} iterations)")
+                    results[name] = run_micro(fn, args.iterations)
+        finally:
+            db.close()
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n[ERROR] Performance regressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            status = 1
+        else:
+            print(f"\n[INFO] No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Baseline written to {args.save_baseline}")
+
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
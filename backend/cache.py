@@ -0,0 +1,546 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import metrics
+
+# Cache tier shared by every worker/instance of backend_server:app.
+#
+#   CACHE_BACKEND=memory  in-process LRU only (default, single worker)
+#   CACHE_BACKEND=sqlite  shared SQLite file (mmap) for workers on one host
+#   CACHE_BACKEND=redis   Redis (or anything speaking RESP) at CACHE_REDIS_URL
+#
+# With a shared backend each worker keeps a small in-process LRU in front of
+# it. Deletes are broadcast as invalidation messages so other workers drop
+# their local copy; the local TTL bounds staleness if a message is missed.
+#
+# The memory and SQLite backends evict by total value size against
+# CACHE_MAX_BYTES. Redis expires keys on its own, so this module cannot
+# account for what is stored under its prefix: bound it with the server's
+# maxmemory and an eviction policy such as allkeys-lru. There,
+# CACHE_MAX_BYTES only rejects single values larger than it.
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "scholar")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_LOCAL_MAX_BYTES = int(os.getenv("CACHE_LOCAL_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "30"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "/tmp/scholar_ai_cache.db")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"))
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", "1"))
+# A shared backend that errors or times out is bypassed (every lookup is a
+# miss) for CACHE_RETRY_SECONDS, so an unreachable Redis costs at most one
+# short timeout per retry window instead of one per request
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", "0.25"))
+CACHE_RETRY_SECONDS = float(os.getenv("CACHE_RETRY_SECONDS", "5"))
+
+def _now() -> float:
+    return time.time()
+
+def _expiry(ttl: Optional[float]) -> Optional[float]:
+    return _now() + ttl if ttl else None
+
+# ===== Backends =====
+
+class CacheBackend(ABC):
+    """Byte-oriented key/value store. Keys arrive already namespaced."""
+
+    name = "base"
+    # Values larger than this are not stored
+    max_bytes = CACHE_MAX_BYTES
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """{"entries": n, "bytes": n} for size accounting"""
+
+    # Cross-worker invalidation; no-ops for process-local backends
+    def publish_invalidation(self, message: Dict):
+        pass
+
+    def subscribe_invalidations(self, callback: Callable[[Dict], None]):
+        pass
+
+    def poll_invalidations(self):
+        """Deliver pending invalidations (backends without push delivery)"""
+        pass
+
+class MemoryCache(CacheBackend):
+    """In-process LRU bounded by total value size"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= _now():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, _expiry(ttl))
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.size}
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+class SQLiteCache(CacheBackend):
+    """Cache in a SQLite file shared by all workers on the same host.
+
+    Uses WAL and a memory-mapped database file, so reads are mostly page
+    cache hits. Invalidations go through a table that workers poll.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_bytes: int = CACHE_MAX_BYTES,
+                 poll_seconds: float = CACHE_INVALIDATION_POLL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self._callbacks: List[Callable[[Dict], None]] = []
+        self._last_invalidation = 0
+        self._last_poll = 0.0
+        self._poll_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL
+            );
+            CREATE TABLE IF NOT EXISTS cache_invalidations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+        """)
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()
+        self._last_invalidation = row[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=CACHE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={256 * 1024 * 1024}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires <= _now():
+            self.delete(key)
+            return None
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, size, expires) VALUES (?, ?, ?, ?)",
+            (key, sqlite3.Binary(value), len(value), _expiry(ttl)))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._enforce_size()
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def stats(self) -> Dict[str, int]:
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        return {"entries": entries, "bytes": size}
+
+    def _enforce_size(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?", (_now(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict the oldest rows (lowest rowid) until back under the limit
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM cache_entries ORDER BY rowid"):
+            doomed.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM cache_entries WHERE rowid = ?", doomed)
+
+    def publish_invalidation(self, message: Dict):
+        conn = self._conn()
+        conn.execute("INSERT INTO cache_invalidations (message, created) VALUES (?, ?)",
+                     (json.dumps(message), _now()))
+        conn.execute("DELETE FROM cache_invalidations WHERE created < ?", (_now() - 3600,))
+
+    def subscribe_invalidations(self, callback: Callable[[Dict], None]):
+        self._callbacks.append(callback)
+
+    def poll_invalidations(self):
+        if not self._callbacks or _now() - self._last_poll < self.poll_seconds:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_poll = _now()
+            rows = self._conn().execute(
+                "SELECT id, message FROM cache_invalidations WHERE id > ? ORDER BY id",
+                (self._last_invalidation,)).fetchall()
+            for row_id, message in rows:
+                self._last_invalidation = row_id
+                for callback in self._callbacks:
+                    callback(json.loads(message))
+        finally:
+            self._poll_lock.release()
+
+class RedisProtocolError(Exception):
+    pass
+
+class RedisConnection:
+    """Minimal blocking RESP2 connection (no external dependency)"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None,
+                 timeout: Optional[float] = 2.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisProtocolError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self.read() for _ in range(length)]
+        raise RedisProtocolError(f"Unexpected reply: {line!r}")
+
+    def execute(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisCache(CacheBackend):
+    """Cache on a Redis-protocol server; invalidations use PUBLISH/SUBSCRIBE.
+
+    Total size is bounded by the server (maxmemory), not by max_bytes.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_REDIS_URL, channel: Optional[str] = None,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.max_bytes = max_bytes
+        self.channel = channel or f"{CACHE_PREFIX}:invalidations"
+        self._local = threading.local()
+        self._subscriber: Optional[threading.Thread] = None
+        self._callbacks: List[Callable[[Dict], None]] = []
+
+    def _connect(self, timeout: Optional[float] = CACHE_TIMEOUT) -> RedisConnection:
+        return RedisConnection(self.host, self.port, self.db, self.password, timeout)
+
+    def _execute(self, *args):
+        conn = getattr(self._local, "conn", None)
+        try:
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            return conn.execute(*args)
+        except (OSError, ConnectionError):
+            # One reconnect attempt on a dropped connection
+            if conn is not None:
+                conn.close()
+            conn = self._local.conn = self._connect()
+            return conn.execute(*args)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._execute("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+        if ttl:
+            self._execute("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self._execute("SET", key, value)
+
+    def delete(self, key: str):
+        self._execute("DEL", key)
+
+    def delete_prefix(self, prefix: str):
+        cursor = b"0"
+        while True:
+            cursor, keys = self._execute("SCAN", cursor, "MATCH", prefix + "*", "COUNT", 500)
+            if keys:
+                self._execute("DEL", *keys)
+            if cursor in (b"0", "0", 0):
+                break
+
+    def stats(self) -> Dict[str, int]:
+        """Figures for the whole Redis database, not just this cache's prefix"""
+        entries = self._execute("DBSIZE")
+        info = self._execute("INFO", "memory") or b""
+        used = 0
+        for line in info.decode().splitlines():
+            if line.startswith("used_memory:"):
+                used = int(line.split(":", 1)[1])
+        return {"entries": entries, "bytes": used}
+
+    def publish_invalidation(self, message: Dict):
+        self._execute("PUBLISH", self.channel, json.dumps(message))
+
+    def subscribe_invalidations(self, callback: Callable[[Dict], None]):
+        self._callbacks.append(callback)
+        if self._subscriber is None:
+            self._subscriber = threading.Thread(target=self._listen, daemon=True)
+            self._subscriber.start()
+
+    def _listen(self):
+        backoff = 0.5
+        while True:
+            try:
+                conn = self._connect()
+                conn.execute("SUBSCRIBE", self.channel)
+                conn.sock.settimeout(None)  # wait for messages indefinitely
+                backoff = 0.5
+                while True:
+                    reply = conn.read()
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        message = json.loads(reply[2])
+                        for callback in self._callbacks:
+                            callback(message)
+            except Exception as e:
+                print(f"[WARNING] Cache invalidation subscriber: {e}; reconnecting")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+# ===== Cache Facade =====
+
+class Cache:
+    """Namespaced cache over a backend, with an optional local LRU tier.
+
+    Keys are "<prefix>:<namespace>:<key>". Lookups are reported to the
+    cache_requests_total metric per namespace. set() does not notify other
+    workers; when a cached value changes, delete() it so every worker's
+    local copy is dropped.
+    """
+
+    def __init__(self, backend: CacheBackend, local: Optional[MemoryCache] = None,
+                 local_ttl: float = CACHE_LOCAL_TTL):
+        self.backend = backend
+        self.local = local
+        self.local_ttl = local_ttl
+        self.worker_id = uuid.uuid4().hex
+        self._retry_at = 0.0
+        if local is not None:
+            backend.subscribe_invalidations(self._on_invalidation)
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{CACHE_PREFIX}:{namespace}:{key}"
+
+    def _call(self, action: str, fn: Callable, *args) -> Tuple[bool, Any]:
+        """Run a backend operation unless the backend is being bypassed"""
+        if self._retry_at and _now() < self._retry_at:
+            return False, None
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"[WARNING] Cache {action} failed ({self.backend.name}): {e}; "
+                  f"bypassing it for {CACHE_RETRY_SECONDS:g}s")
+            self._retry_at = _now() + CACHE_RETRY_SECONDS
+            return False, None
+        self._retry_at = 0.0
+        return True, result
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        full_key = self._key(namespace, key)
+        value = None
+        if self.local is not None:
+            self._call("poll", self.backend.poll_invalidations)
+            value = self.local.get(full_key)
+        if value is None:
+            _, value = self._call("get", self.backend.get, full_key)
+            if value is not None and self.local is not None:
+                self.local.set(full_key, value, self.local_ttl)
+        metrics.record_cache(namespace, value is not None)
+        return value
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > self.backend.max_bytes:
+            return
+        full_key = self._key(namespace, key)
+        ok, _ = self._call("set", self.backend.set, full_key, value, ttl)
+        if ok and self.local is not None:
+            self.local.set(full_key, value, min(ttl, self.local_ttl) if ttl else self.local_ttl)
+
+    def delete(self, namespace: str, key: str):
+        """Remove a key everywhere, including other workers' local copies"""
+        full_key = self._key(namespace, key)
+        if self.local is not None:
+            self.local.delete(full_key)
+        ok, _ = self._call("delete", self.backend.delete, full_key)
+        if ok:
+            self._call("publish", self._broadcast, {"key": full_key})
+
+    def clear(self, namespace: str):
+        """Remove every key of a namespace everywhere"""
+        prefix = self._key(namespace, "")
+        if self.local is not None:
+            self.local.delete_prefix(prefix)
+        ok, _ = self._call("clear", self.backend.delete_prefix, prefix)
+        if ok:
+            self._call("publish", self._broadcast, {"prefix": prefix})
+
+    def get_json(self, namespace: str, key: str) -> Any:
+        value = self.get(namespace, key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        self.set(namespace, key, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), ttl)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-tier {"up", "entries", "bytes"}; an unreachable tier is {"up": 0}"""
+        ok, backend_stats = self._call("stats", self.backend.stats)
+        stats = {self.backend.name: {"up": 1, **backend_stats} if ok else {"up": 0}}
+        if self.local is not None:
+            stats["local"] = {"up": 1, **self.local.stats()}
+        return stats
+
+    def _broadcast(self, message: Dict):
+        if self.local is not None:
+            self.backend.publish_invalidation({**message, "origin": self.worker_id})
+
+    def _on_invalidation(self, message: Dict):
+        if message.get("origin") != self.worker_id:
+            self._drop_local(message)
+
+    def _drop_local(self, message: Dict):
+        if "key" in message:
+            self.local.delete(message["key"])
+        elif "prefix" in message:
+            self.local.delete_prefix(message["prefix"])
+
+def create_cache(kind: str = CACHE_BACKEND) -> Cache:
+    if kind == "sqlite":
+        return Cache(SQLiteCache(), local=MemoryCache(CACHE_LOCAL_MAX_BYTES))
+    if kind == "redis":
+        return Cache(RedisCache(), local=MemoryCache(CACHE_LOCAL_MAX_BYTES))
+    if kind != "memory":
+        print(f"[WARNING] Unknown CACHE_BACKEND '{kind}', using in-process memory cache")
+    return Cache(MemoryCache())
+
+# Created on first use, so importing this module opens no connections,
+# starts no subscriber thread and touches no files (cold starts)
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from prompt_budget import get_token_budget, get_tokenizer, trim_head
+
+# Session state is persisted in the chat_sessions table so any instance can
+# continue a conversation; each process keeps recently used sessions (with
+# their trimmed document context) in memory
+CHAT_SESSION_IDLE_SECONDS = int(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "200"))
+# Token budgets for the verbatim recent turns and the running summary
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "800"))
+# How much of each compacted answer survives in the summary
+SUMMARY_ANSWER_TOKENS = 60
+# Room left for instructions and the question when pre-trimming the document
+PROMPT_OVERHEAD_TOKENS = 1000
+
+CHAT_PROMPT_TEMPLATE = """
+        You are an intelligent academic assistant helping the user with the document "{filename}".
+
+        Context from document:
+        {context}
+
+        Summary of the earlier conversation:
+        {summary}
+
+        Recent conversation:
+        {history}
+
+        User Question: {question}
+
+        Please answer the question based on the provided document context and the conversation so far. If the answer is not in the context, use your general knowledge but mention that it's not in the document.
+        """
+
+def format_history(turns) -> str:
+    return "\n\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+
+class ChatSession:
+    """A conversation bound to one ReferenceDocument.
+
+    The document is parsed and trimmed to the model's token budget once, when
+    the session is created. Older turns are compacted into a running summary
+    so each prompt stays within budget however long the conversation gets.
+    """
+
+    def __init__(self, user_id: int, document_id: int, filename: str, text: str, model: str,
+                 session_id: Optional[str] = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.document_id = document_id
+        self.filename = filename
+        self.model = model
+        self.turns: List[Tuple[str, str]] = []
+        self.summary_lines: List[str] = []
+        self.turn_count = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+        tokenizer = get_tokenizer(model)
+        context_budget = (get_token_budget(model) - CHAT_HISTORY_TOKEN_BUDGET
+                          - CHAT_SUMMARY_TOKEN_BUDGET - PROMPT_OVERHEAD_TOKENS)
+        self.character_count = len(text)
+        self.context = trim_head(text, max(context_budget, 0), tokenizer)
+
+    @classmethod
+    def restore(cls, record, filename: str, text: str) -> "ChatSession":
+        """Rebuild a session from its ChatSessionRecord and the document text"""
+        session = cls(record.user_id, record.document_id, filename, text, record.model, session_id=record.id)
+        session.turns = [(q, a) for q, a in record.turns or []]
+        session.summary_lines = list(record.summary_lines or [])
+        session.turn_count = record.turn_count
+        return session
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines) or "(none)"
+
+    @property
+    def history(self) -> str:
+        return format_history(self.turns) or "(none)"
+
+    def next_state(self, question: str, answer: str) -> dict:
+        """Conversation state after one more turn, keyed like the
+        ChatSessionRecord columns. The session itself is left unchanged
+        until apply() is called, i.e. once the state has been stored."""
+        with self.lock:
+            turns = [[q, a] for q, a in self.turns] + [[question, answer]]
+            summary_lines = list(self.summary_lines)
+            turn_count = self.turn_count + 1
+        self._compact(turns, summary_lines)
+        return {"turns": turns, "summary_lines": summary_lines, "turn_count": turn_count}
+
+    def apply(self, state: dict):
+        with self.lock:
+            self.turns = [(q, a) for q, a in state["turns"]]
+            self.summary_lines = list(state["summary_lines"])
+            self.turn_count = state["turn_count"]
+
+    def _compact(self, turns: List[List[str]], summary_lines: List[str]):
+        tokenizer = get_tokenizer(self.model)
+        # Keep the latest turn verbatim; fold older ones into the summary
+        while len(turns) > 1 and tokenizer.estimate(format_history(turns)) > CHAT_HISTORY_TOKEN_BUDGET:
+            question, answer = turns.pop(0)
+            short_answer = trim_head(" ".join(answer.split()), SUMMARY_ANSWER_TOKENS, tokenizer)
+            if len(short_answer) < len(answer.strip()):
+                short_answer += " ..."
+            summary_lines.append(f"- Q: {question} A: {short_answer}")
+        while len(summary_lines) > 1 and tokenizer.estimate("\n".join(summary_lines)) > CHAT_SUMMARY_TOKEN_BUDGET:
+            summary_lines.pop(0)
+
+class ChatSessionStore:
+    """Per-process cache of sessions with idle expiry and an LRU cap"""
+
+    def __init__(self, idle_seconds: int = CHAT_SESSION_IDLE_SECONDS, max_sessions: int = CHAT_MAX_SESSIONS):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+
+    def add(self, session: ChatSession) -> ChatSession:
+        with self._lock:
+            self._evict_idle()
+            while len(self._sessions) >= self.max_sessions:
+                oldest = min(self._sessions.values(), key=lambda s: s.last_used)
+                del self._sessions[oldest.id]
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str, user_id: int) -> Optional[ChatSession]:
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return None
+            session.last_used = time.monotonic()
+            return session
+
+    def remove(self, session_id: str, user_id: int) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return False
+            del self._sessions[session_id]
+            return True
+
+    def remove_document(self, document_id: int):
+        """Drop every session bound to a deleted document"""
+        with self._lock:
+            for session_id in [s.id for s in self._sessions.values() if s.document_id == document_id]:
+                del self._sessions[session_id]
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for session_id in [s.id for s in self._sessions.values() if s.last_used < cutoff]:
+            del self._sessions[session_id]
+
+    def __len__(self):
+        return len(self._sessions)
+
+chat_sessions = ChatSessionStore()
@@ -1,30 +1,64 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import create_engine, event, inspect, update, Column, Integer, String, DateTime, ForeignKey, Text, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 
 import os
+import threading
 
 # Database configuration
-# SQLite only - use /tmp on Vercel (read-only FS), local file otherwise
-# Database configuration
+# DATABASE_URL selects the primary (read/write) database. Without it we fall
+# back to SQLite - /tmp on Vercel (read-only FS), local file otherwise.
+# DATABASE_REPLICA_URL optionally points read-only list queries at a replica.
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
 
 if not DATABASE_URL:
-    # SQLite only - use /tmp on Vercel (read-only FS), local file otherwise
     if os.environ.get("VERCEL"):
+        print("[WARNING] DATABASE_URL is not set; using /tmp SQLite, data is lost between instances")
         DATABASE_URL = "sqlite:////tmp/scholar_ai.db"
     else:
         DATABASE_URL = "sqlite:///./scholar_ai.db"
 
-# SQLite-specific connection args
-if "sqlite" in DATABASE_URL:
-    connect_args = {"check_same_thread": False}
-else:
-    connect_args = {}
+# Pool settings for server databases (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def normalize_url(url: str) -> str:
+    # Heroku/Vercel/Supabase style URLs use the scheme SQLAlchemy dropped
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+def make_engine(url: str):
+    url = normalize_url(url)
+    kwargs = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if url.startswith("sqlite"):
+        # SQLite-specific connection args
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            return create_engine(url, **kwargs)
+    kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return create_engine(url, **kwargs)
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if DATABASE_REPLICA_URL:
+    read_engine = make_engine(DATABASE_REPLICA_URL)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
 Base = declarative_base()
 
 # User model
@@ -86,13 +120,152 @@ class ReferenceDocument(Base):
     # Relationship
     user = relationship("User", back_populates="reference_documents")
 
+# Extracted text of a reference document, stored at upload time so chat
+# sessions can be opened without re-uploading or re-parsing the file
+class ReferenceText(Base):
+    __tablename__ = "reference_texts"
+    
+    document_id = Column(Integer, ForeignKey("reference_documents.id"), primary_key=True)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Conversation state of a chat session (see chat_sessions.py). The document
+# context is not stored; it is rebuilt from reference_texts when a session is
+# resumed on another instance.
+class ChatSessionRecord(Base):
+    __tablename__ = "chat_sessions"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("reference_documents.id"), nullable=False, index=True)
+    model = Column(String, nullable=False)
+    turns = Column(JSON, nullable=False, default=list)  # [[question, answer], ...]
+    summary_lines = Column(JSON, nullable=False, default=list)
+    turn_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Per-user collection version, bumped in the same transaction as every
+# mutation of that collection. Lets list endpoints answer conditional GETs
+# (ETag / If-None-Match) with a primary-key lookup instead of a full query.
+class CollectionVersion(Base):
+    __tablename__ = "collection_versions"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    collection = Column(String, primary_key=True)  # history, glossary, references
+    version = Column(Integer, nullable=False, default=0)
+
+COLLECTIONS = {
+    HistoryRecord: "history",
+    GlossaryTerm: "glossary",
+    ReferenceDocument: "references",
+}
+
+def get_collection_version(db, user_id: int, collection: str) -> int:
+    row = db.get(CollectionVersion, (user_id, collection))
+    return row.version if row else 0
+
 # Create all tables
+# Runs at most once per process, and only issues CREATE statements when a
+# table is actually missing (one table listing query otherwise).
+_schema_ready = False
+_schema_lock = threading.Lock()
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        _create_missing_tables(engine)
+        # A real replica gets its schema through replication; a SQLite file
+        # standing in for one (local testing) needs it created here.
+        if read_engine is not engine and read_engine.dialect.name == "sqlite":
+            _create_missing_tables(read_engine)
+        _schema_ready = True
+
+def _create_missing_tables(bind):
+    existing = set(inspect(bind).get_table_names())
+    missing = [t for t in Base.metadata.sorted_tables if t.name not in existing]
+    if missing:
+        Base.metadata.create_all(bind=bind, tables=missing)
 
 # Dependency to get DB session
 def get_db():
+    init_db()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# ===== Collection Versions =====
+
+@event.listens_for(SessionLocal, "before_flush")
+def _bump_collection_versions(session, flush_context, instances):
+    changed = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        collection = COLLECTIONS.get(type(obj))
+        if collection and obj.user_id is not None:
+            changed.add((obj.user_id, collection))
+    for user_id, collection in changed:
+        _increment_version(session, user_id, collection)
+
+def _increment_version(session, user_id: int, collection: str):
+    # Single atomic upsert, so concurrent first writes to a collection cannot
+    # both insert (UPDATE-then-INSERT races under READ COMMITTED)
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(CollectionVersion).values(user_id=user_id, collection=collection, version=1)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[CollectionVersion.user_id, CollectionVersion.collection],
+            set_={"version": CollectionVersion.version + 1},
+        ))
+        return
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(CollectionVersion).values(user_id=user_id, collection=collection, version=1)
+        session.execute(stmt.on_duplicate_key_update(version=CollectionVersion.version + 1))
+        return
+    result = session.execute(
+        update(CollectionVersion)
+        .where(CollectionVersion.user_id == user_id, CollectionVersion.collection == collection)
+        .values(version=CollectionVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        session.add(CollectionVersion(user_id=user_id, collection=collection, version=1))
+
+# ===== Read Replica Routing =====
+
+def get_read_db(user_id=None, collection=None):
+    """Session for read-only queries of one user's collection.
+
+    Served by the replica when one is configured and has caught up with the
+    primary for (user_id, collection); otherwise by the primary, so users
+    always read their own writes. Versions are compared in the database, so
+    this holds across workers and serverless instances.
+    """
+    init_db()
     db = SessionLocal()
+    if ReadSessionLocal is not SessionLocal and user_id is not None and collection is not None:
+        replica = ReadSessionLocal()
+        try:
+            caught_up = (get_collection_version(replica, user_id, collection)
+                         >= get_collection_version(db, user_id, collection))
+        except Exception as e:
+            print(f"[WARNING] Replica version check failed, reading from primary: {e}")
+            caught_up = False
+        if caught_up:
+            db.close()
+            db = replica
+        else:
+            replica.close()
     try:
         yield db
     finally:
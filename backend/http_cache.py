@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from cache import get_cache
+
+# Brotli is optional; without it large responses are gzip-compressed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Serialised bodies are cached per (user, collection, version, encoding).
+# The version is part of the key, so entries never go stale: a mutation
+# bumps the version and the old entry simply ages out.
+BODY_CACHE_TTL = int(os.getenv("BODY_CACHE_TTL", "3600"))
+
+# Bump when the JSON shape of a list endpoint changes. Together with the
+# deployment id it salts ETags and cached bodies, so a deploy that changes
+# serialisation never answers 304 with, or serves, a body built by old code.
+BODY_SCHEMA_VERSION = 1
+BUILD_ID = (os.getenv("BUILD_ID") or os.getenv("VERCEL_DEPLOYMENT_ID")
+            or os.getenv("VERCEL_GIT_COMMIT_SHA") or "dev")[:12]
+BODY_SALT = f"{BODY_SCHEMA_VERSION}.{BUILD_ID}"
+
+# ===== Content Negotiation =====
+
+def _accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+def choose_encoding(accept_encoding: Optional[str], size: int) -> Optional[str]:
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+# ===== Conditional GET =====
+
+def make_etag(user_id: int, collection: str, version: int) -> str:
+    # Weak, since the same version is served with different encodings
+    return f'W/"{collection}-{user_id}-{version}-{BODY_SALT}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def versioned_json_response(
+    request: Request,
+    user_id: int,
+    collection: str,
+    version: int,
+    build: Callable[[], object],
+) -> Response:
+    """Serve a per-user collection honouring If-None-Match.
+
+    `build` runs the query and returns the JSON-able payload; it is only
+    called when neither the client nor the body cache has this version.
+    """
+    etag = make_etag(user_id, collection, version)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding, Authorization",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = f"{BODY_SALT}:{user_id}:{collection}:{version}"
+    identity = get_cache().get("collection_body", key)
+    if identity is None:
+        identity = json.dumps(build(), ensure_ascii=False, allow_nan=False,
+                              separators=(",", ":")).encode("utf-8")
+        get_cache().set("collection_body", key, identity, BODY_CACHE_TTL)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding"), len(identity))
+    if encoding is None:
+        return Response(identity, media_type="application/json", headers=headers)
+
+    body = get_cache().get("collection_body", f"{key}:{encoding}")
+    if body is None:
+        body = compress(identity, encoding)
+        get_cache().set("collection_body", f"{key}:{encoding}", body, BODY_CACHE_TTL)
+    headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,189 @@
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+# ===== Model Resolution =====
+
+def resolve_model(model_name: str) -> str:
+    """Map the model name sent by the UI to the Gemini model we call"""
+    return "gemini-1.5-pro" if "pro" in model_name else "gemini-1.5-flash"
+
+# Per-model prompt budgets (in estimated tokens). These are well below the
+# real context windows on purpose: bigger prompts are slower and pricier.
+MODEL_TOKEN_BUDGETS = {
+    "gemini-1.5-pro": int(os.getenv("GEMINI_PRO_TOKEN_BUDGET", "64000")),
+    "gemini-1.5-flash": int(os.getenv("GEMINI_FLASH_TOKEN_BUDGET", "32000")),
+}
+
+def get_token_budget(model_name: str) -> int:
+    return MODEL_TOKEN_BUDGETS[resolve_model(model_name)]
+
+# ===== Token Estimation =====
+
+class TokenizerApprox:
+    """Cheap stand-in for a real tokenizer.
+
+    Wide characters (CJK etc., 3+ bytes in UTF-8) cost roughly one token each,
+    while Latin text averages a few characters per token. Both counts come from
+    len() calls, so estimating is O(n) in C and needs no regex pass.
+    """
+
+    def __init__(self, chars_per_token: float, wide_tokens_per_char: float):
+        self.chars_per_token = chars_per_token
+        self.wide_tokens_per_char = wide_tokens_per_char
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        n_chars = len(text)
+        n_bytes = len(text.encode("utf-8"))
+        # Each 3-byte character adds 2 extra bytes over its char count
+        wide = min(n_chars, (n_bytes - n_chars) // 2)
+        narrow = n_chars - wide
+        return int(wide * self.wide_tokens_per_char + narrow / self.chars_per_token) + 1
+
+TOKENIZER_PROFILES = {
+    "gemini-1.5-pro": (4.0, 1.0),
+    "gemini-1.5-flash": (4.0, 1.0),
+}
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name: str) -> TokenizerApprox:
+    """Return the (cached) tokenizer approximation for a model"""
+    chars_per_token, wide_ratio = TOKENIZER_PROFILES[resolve_model(model_name)]
+    return TokenizerApprox(chars_per_token, wide_ratio)
+
+def estimate_tokens(text: str, model_name: str = "flash") -> int:
+    return get_tokenizer(model_name).estimate(text)
+
+# ===== Trimming Strategies =====
+
+def _longest_prefix(text: str, max_tokens: int, tokenizer: TokenizerApprox) -> int:
+    """Binary search for the longest prefix length that fits in max_tokens"""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if tokenizer.estimate(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def trim_head(text: str, max_tokens: int, tokenizer: TokenizerApprox) -> str:
+    """Keep the beginning of the text"""
+    return text[:_longest_prefix(text, max_tokens, tokenizer)]
+
+def trim_tail(text: str, max_tokens: int, tokenizer: TokenizerApprox) -> str:
+    """Keep the end of the text"""
+    keep = _longest_prefix(text[::-1], max_tokens, tokenizer)
+    return text[len(text) - keep:] if keep else ""
+
+TRIM_MARKER = "\n\n[... content omitted ...]\n\n"
+
+def trim_head_tail(text: str, max_tokens: int, tokenizer: TokenizerApprox) -> str:
+    """Keep the beginning and the end (abstract/intro and conclusions)"""
+    half = (max_tokens - tokenizer.estimate(TRIM_MARKER)) // 2
+    if half <= 0:
+        return trim_head(text, max_tokens, tokenizer)
+    return trim_head(text, half, tokenizer) + TRIM_MARKER + trim_tail(text, half, tokenizer)
+
+def trim_lines(text: str, max_tokens: int, tokenizer: TokenizerApprox) -> str:
+    """Keep whole lines from the top (used for glossary lists)"""
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = tokenizer.estimate(line + "\n")
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+TrimStrategy = Callable[[str, int, TokenizerApprox], str]
+
+TRIM_STRATEGIES: Dict[str, TrimStrategy] = {
+    "head": trim_head,
+    "tail": trim_tail,
+    "head_tail": trim_head_tail,
+    "lines": trim_lines,
+}
+
+def register_trim_strategy(name: str, strategy: TrimStrategy):
+    """Register a custom trimming strategy usable by PromptBuilder sections"""
+    TRIM_STRATEGIES[name] = strategy
+
+# ===== Prompt Builder =====
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    strategy: Optional[str] = None  # None means the section is never trimmed
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    model: str
+    estimated_tokens: int
+    budget: int
+    section_tokens: Dict[str, int] = field(default_factory=dict)
+    trimmed: List[str] = field(default_factory=list)
+
+class PromptBuilder:
+    """Assemble a prompt template from sections within a per-model token budget.
+
+    Fixed sections (no strategy) are always kept in full. Whatever budget is
+    left is handed to trimmable sections in the order they were added.
+    """
+
+    def __init__(self, model_name: str, budget: Optional[int] = None):
+        self.model = resolve_model(model_name)
+        self.tokenizer = get_tokenizer(self.model)
+        self.budget = budget if budget is not None else MODEL_TOKEN_BUDGETS[self.model]
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, text: str, strategy: Optional[str] = None) -> "PromptBuilder":
+        if strategy is not None and strategy not in TRIM_STRATEGIES:
+            raise ValueError(f"Unknown trim strategy: {strategy}")
+        self.sections.append(PromptSection(name, text or "", strategy))
+        return self
+
+    def build(self, template: str) -> BuiltPrompt:
+        estimate = self.tokenizer.estimate
+        empty = {s.name: "" for s in self.sections}
+        remaining = self.budget - estimate(template.format(**empty))
+
+        values: Dict[str, str] = {}
+        section_tokens: Dict[str, int] = {}
+        trimmed: List[str] = []
+
+        for section in self.sections:
+            if section.strategy is None:
+                values[section.name] = section.text
+                section_tokens[section.name] = estimate(section.text)
+                remaining -= section_tokens[section.name]
+
+        for section in self.sections:
+            if section.strategy is None:
+                continue
+            tokens = estimate(section.text)
+            if tokens > remaining:
+                strategy = TRIM_STRATEGIES[section.strategy]
+                values[section.name] = strategy(section.text, max(remaining, 0), self.tokenizer)
+                tokens = estimate(values[section.name])
+                trimmed.append(section.name)
+            else:
+                values[section.name] = section.text
+            section_tokens[section.name] = tokens
+            remaining -= tokens
+
+        text = template.format(**values)
+        return BuiltPrompt(
+            text=text,
+            model=self.model,
+            estimated_tokens=estimate(text),
+            budget=self.budget,
+            section_tokens=section_tokens,
+            trimmed=trimmed,
+        )
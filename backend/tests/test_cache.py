@@ -0,0 +1,254 @@
+import socket
+import time
+
+import pytest
+
+import cache
+from benchmarks import redis_standin
+from cache import Cache, MemoryCache, RedisCache, SQLiteCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable replacement for cache._now"""
+    now = [1000.0]
+    monkeypatch.setattr(cache, "_now", lambda: now[0])
+    return now
+
+def eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class FlakyBackend(MemoryCache):
+    """Memory backend that raises while `down` is set"""
+
+    name = "flaky"
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("backend unreachable")
+        return super().get(key)
+
+    def set(self, key, value, ttl=None):
+        if self.down:
+            raise ConnectionError("backend unreachable")
+        super().set(key, value, ttl)
+
+    def stats(self):
+        if self.down:
+            raise ConnectionError("backend unreachable")
+        return super().stats()
+
+# ===== Memory Backend =====
+
+def test_memory_cache_evicts_least_recently_used():
+    backend = MemoryCache(max_bytes=30)
+    for key in ("a", "b", "c"):
+        backend.set(key, b"x" * 10)
+    backend.get("a")
+    backend.set("d", b"x" * 10)
+    assert backend.get("b") is None
+    assert all(backend.get(key) is not None for key in ("a", "c", "d"))
+    assert backend.stats() == {"entries": 3, "bytes": 30}
+
+def test_memory_cache_skips_values_over_its_size():
+    backend = MemoryCache(max_bytes=10)
+    backend.set("small", b"x" * 5)
+    backend.set("big", b"x" * 11)
+    assert backend.get("big") is None
+    assert backend.get("small") == b"x" * 5
+
+def test_memory_cache_replacing_a_key_keeps_size_accurate():
+    backend = MemoryCache()
+    backend.set("a", b"x" * 10)
+    backend.set("a", b"y" * 4)
+    backend.delete_prefix("b")
+    assert backend.stats() == {"entries": 1, "bytes": 4}
+
+def test_memory_cache_expires_entries(clock):
+    backend = MemoryCache()
+    backend.set("short", b"1", ttl=10)
+    backend.set("forever", b"2")
+    clock[0] += 9
+    assert backend.get("short") == b"1"
+    clock[0] += 1
+    assert backend.get("short") is None
+    assert backend.get("forever") == b"2"
+    assert backend.stats() == {"entries": 1, "bytes": 1}
+
+def test_facade_namespaces_and_json():
+    c = Cache(MemoryCache())
+    c.set_json("users", "1", {"email": "a@example.com"})
+    c.set("glossary", "1", b"terms")
+    assert c.get_json("users", "1") == {"email": "a@example.com"}
+    c.clear("users")
+    assert c.get_json("users", "1") is None
+    assert c.get("glossary", "1") == b"terms"
+
+# ===== SQLite Backend =====
+
+def test_sqlite_invalidation_reaches_other_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = Cache(SQLiteCache(path, poll_seconds=0), local=MemoryCache())
+    reader = Cache(SQLiteCache(path, poll_seconds=0), local=MemoryCache())
+
+    writer.set("users", "1", b"old")
+    assert reader.get("users", "1") == b"old"
+
+    # The reader's local tier still holds the value until it polls
+    writer.backend.set(writer._key("users", "1"), b"new")
+    assert reader.get("users", "1") == b"old"
+
+    writer.delete("users", "1")
+    assert reader.get("users", "1") is None
+
+    writer.set("glossary", "1:1", b"a")
+    writer.set("glossary", "1:2", b"b")
+    assert reader.get("glossary", "1:1") == b"a"
+    writer.clear("glossary")
+    assert reader.get("glossary", "1:1") is None
+
+def test_sqlite_instance_ignores_its_own_invalidations(tmp_path):
+    c = Cache(SQLiteCache(str(tmp_path / "cache.db"), poll_seconds=0), local=MemoryCache())
+    c.set("users", "1", b"v1")
+    c.delete("users", "2")
+    c.set("users", "1", b"v2")
+    assert c.local.get(c._key("users", "1")) == b"v2"
+    assert c.get("users", "1") == b"v2"
+
+def test_sqlite_expiry_and_size_bound(tmp_path, clock):
+    backend = SQLiteCache(str(tmp_path / "cache.db"), max_bytes=500)
+    backend.set("short", b"x", ttl=5)
+    clock[0] += 5
+    assert backend.get("short") is None
+
+    for i in range(99):  # size is enforced on every 100th write
+        backend.set(f"k{i}", b"x" * 10)
+    assert backend.stats()["bytes"] <= 500
+    assert backend.get("k98") is not None
+    assert backend.get("k0") is None
+
+# ===== Redis Backend =====
+
+@pytest.fixture(scope="module")
+def redis_url():
+    port = free_port()
+    redis_standin.start_in_thread(port)
+    return f"redis://127.0.0.1:{port}/0"
+
+@pytest.fixture
+def redis_pair(redis_url, request):
+    """Two facades on one Redis, as on two instances, with pub/sub ready"""
+    channel = f"test:{request.node.name}"
+    first = Cache(RedisCache(redis_url, channel=channel), local=MemoryCache())
+    second = Cache(RedisCache(redis_url, channel=channel), local=MemoryCache())
+    for c in (first, second):
+        c.clear("test")
+    # The subscriber threads start asynchronously; wait until both receive
+    for sender, receiver in ((first, second), (second, first)):
+        probe = receiver._key("probe", "ready")
+        receiver.local.set(probe, b"1")
+        assert eventually(lambda: sender._broadcast({"key": probe})
+                          or receiver.local.get(probe) is None)
+    return first, second
+
+def test_redis_get_set_and_ttl(redis_url):
+    c = Cache(RedisCache(redis_url))
+    c.set("test", "plain", b"value")
+    c.set("test", "short", b"value", ttl=0.2)
+    assert c.get("test", "plain") == b"value"
+    assert c.get("test", "short") == b"value"
+    assert c.get("test", "missing") is None
+    time.sleep(0.3)
+    assert c.get("test", "short") is None
+    assert c.get("test", "plain") == b"value"
+    assert c.stats()["redis"]["up"] == 1
+
+def test_redis_skips_oversized_values(redis_url):
+    c = Cache(RedisCache(redis_url, max_bytes=10), local=MemoryCache())
+    c.set("test", "big", b"x" * 11)
+    assert c.get("test", "big") is None
+    assert c.local.stats()["entries"] == 0
+
+def test_redis_delete_invalidates_other_local_tier(redis_pair):
+    first, second = redis_pair
+    first.set("test", "k", b"old")
+    assert second.get("test", "k") == b"old"
+    full_key = second._key("test", "k")
+    assert second.local.get(full_key) == b"old"
+
+    first.delete("test", "k")
+    assert eventually(lambda: second.local.get(full_key) is None)
+    assert second.get("test", "k") is None
+
+def test_redis_clear_invalidates_other_local_tier(redis_pair):
+    first, second = redis_pair
+    for key in ("a", "b"):
+        first.set("test", key, b"v")
+        assert second.get("test", key) == b"v"
+
+    first.clear("test")
+    assert eventually(lambda: second.local.stats()["entries"] == 0)
+    assert second.get("test", "a") is None
+
+def test_redis_down_reports_up_zero():
+    c = Cache(RedisCache(f"redis://127.0.0.1:{free_port()}/0"))
+    assert c.get("test", "k") is None
+    assert c.stats() == {"redis": {"up": 0}}
+
+# ===== Failure Handling =====
+
+def test_failing_backend_is_bypassed_until_retry(clock, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_RETRY_SECONDS", 5)
+    backend = FlakyBackend()
+    c = Cache(backend)
+    c.set("test", "k", b"v")
+
+    backend.down = True
+    assert c.get("test", "k") is None
+    assert backend.calls == 1
+
+    # Within the window the backend is not touched at all
+    clock[0] += 4.9
+    assert c.get("test", "k") is None
+    c.set("test", "k2", b"v2")
+    assert backend.calls == 1
+    assert c._key("test", "k2") not in backend._entries
+
+    # After the window it is tried again and recovers
+    backend.down = False
+    clock[0] += 0.1
+    assert c.get("test", "k") == b"v"
+    assert c._retry_at == 0.0
+
+def test_set_is_not_stored_locally_when_backend_fails(clock):
+    backend = FlakyBackend()
+    c = Cache(backend, local=MemoryCache())
+    backend.down = True
+    c.set("test", "k", b"v")
+    assert c.local.stats()["entries"] == 0
+
+def test_stats_report_down_backend(clock):
+    backend = FlakyBackend()
+    c = Cache(backend, local=MemoryCache())
+    c.set("test", "k", b"v")
+    assert c.stats()["flaky"] == {"up": 1, "entries": 1, "bytes": 1}
+
+    backend.down = True
+    stats = c.stats()
+    assert stats["flaky"] == {"up": 0}
+    assert stats["local"] == {"up": 1, "entries": 1, "bytes": 1}
@@ -0,0 +1,192 @@
+import gzip
+import importlib
+import json
+import sys
+
+import pytest
+from starlette.requests import Request
+
+import cache
+import http_cache
+from http_cache import choose_encoding, versioned_json_response
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """database module bound to a single SQLite file"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.delenv("DATABASE_REPLICA_URL", raising=False)
+    sys.modules.pop("database", None)
+    module = importlib.import_module("database")
+    module.init_db()
+    yield module
+    module.engine.dispose()
+    sys.modules.pop("database", None)
+
+@pytest.fixture
+def db(database):
+    session = database.SessionLocal()
+    user = database.User(email="writer@example.com", password_hash="!")
+    session.add(user)
+    session.commit()
+    session.user_id = user.id
+    yield session
+    session.close()
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", cache.Cache(cache.MemoryCache()))
+
+def make_request(**headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+    })
+
+def version(database, db, collection):
+    return database.get_collection_version(db, db.user_id, collection)
+
+# ===== Version Bumps =====
+
+def new_row(database, collection, user_id):
+    if collection == "history":
+        return database.HistoryRecord(user_id=user_id, type="review", title="Draft", content={})
+    if collection == "glossary":
+        return database.GlossaryTerm(user_id=user_id, source="cell", target="细胞")
+    return database.ReferenceDocument(user_id=user_id, filename="a.pdf", file_path="a.pdf", file_type="pdf")
+
+def edit_row(row):
+    for field in ("title", "target", "filename"):
+        if hasattr(row, field):
+            setattr(row, field, getattr(row, field) + " (edited)")
+            return
+
+@pytest.mark.parametrize("collection", ["history", "glossary", "references"])
+def test_insert_update_delete_each_bump_version(database, db, collection):
+    assert version(database, db, collection) == 0
+
+    row = new_row(database, collection, db.user_id)
+    db.add(row)
+    db.commit()
+    assert version(database, db, collection) == 1
+
+    edit_row(row)
+    db.commit()
+    assert version(database, db, collection) == 2
+
+    db.delete(row)
+    db.commit()
+    assert version(database, db, collection) == 3
+
+@pytest.mark.parametrize("collection", ["history", "glossary", "references"])
+def test_bump_is_part_of_the_writing_transaction(database, db, collection):
+    db.add(new_row(database, collection, db.user_id))
+    db.flush()
+    assert version(database, db, collection) == 1
+
+    db.rollback()
+    assert version(database, db, collection) == 0
+    assert db.query(type(new_row(database, collection, db.user_id))).count() == 0
+
+def test_bumps_are_per_collection_and_per_user(database, db):
+    other = database.User(email="other@example.com", password_hash="!")
+    db.add(other)
+    db.commit()
+
+    db.add(new_row(database, "glossary", db.user_id))
+    db.commit()
+    assert version(database, db, "glossary") == 1
+    assert version(database, db, "history") == 0
+    assert database.get_collection_version(db, other.id, "glossary") == 0
+
+def test_unrelated_writes_do_not_bump(database, db):
+    user = db.get(database.User, db.user_id)
+    user.full_name = "Renamed"
+    db.commit()
+    assert all(version(database, db, c) == 0 for c in ("history", "glossary", "references"))
+
+# ===== Conditional GET =====
+
+def test_matching_etag_answers_304_without_building(database, db):
+    def build():
+        raise AssertionError("build must not run for a matching ETag")
+
+    first = versioned_json_response(make_request(), db.user_id, "glossary", 0, lambda: [])
+    etag = first.headers["etag"]
+
+    response = versioned_json_response(make_request(if_none_match=etag), db.user_id, "glossary", 0, build)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.body == b""
+
+def test_cached_body_is_served_without_building(database, db):
+    versioned_json_response(make_request(), db.user_id, "glossary", 0, lambda: [{"source": "cell"}])
+
+    def build():
+        raise AssertionError("build must not run for a cached version")
+
+    response = versioned_json_response(make_request(), db.user_id, "glossary", 0, build)
+    assert json.loads(response.body) == [{"source": "cell"}]
+
+def test_mutation_changes_etag(database, db):
+    def respond(if_none_match=None):
+        headers = {"if_none_match": if_none_match} if if_none_match else {}
+        v = version(database, db, "glossary")
+        terms = [t.source for t in db.query(database.GlossaryTerm).all()]
+        return versioned_json_response(make_request(**headers), db.user_id, "glossary", v, lambda: terms)
+
+    etag = respond().headers["etag"]
+    db.add(new_row(database, "glossary", db.user_id))
+    db.commit()
+
+    response = respond(etag)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert json.loads(response.body) == ["cell"]
+
+# ===== Compression =====
+
+LARGE = http_cache.COMPRESS_MIN_BYTES
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=0.0, identity", None),
+    ("gzip;q=bogus", None),
+    ("GZIP", "gzip"),
+    ("br", None),
+    ("br, gzip", "gzip"),
+])
+def test_choose_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    assert choose_encoding(header, LARGE) == expected
+
+@pytest.mark.parametrize("header,expected", [
+    ("br, gzip", "br"),
+    ("gzip, br;q=0.1", "br"),
+    ("br;q=0, gzip", "gzip"),
+])
+def test_choose_encoding_prefers_brotli_when_installed(monkeypatch, header, expected):
+    monkeypatch.setattr(http_cache, "brotli", object())
+    assert choose_encoding(header, LARGE) == expected
+
+def test_small_bodies_are_not_compressed():
+    assert choose_encoding("gzip", LARGE - 1) is None
+
+def test_gzip_response_round_trips(database, db, monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    payload = [{"source": f"term{i}", "target": "术语"} for i in range(200)]
+
+    response = versioned_json_response(make_request(accept_encoding="gzip, br"),
+                                       db.user_id, "glossary", 0, lambda: payload)
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert json.loads(gzip.decompress(response.body)) == payload
+
+    plain = versioned_json_response(make_request(), db.user_id, "glossary", 0, lambda: payload)
+    assert "content-encoding" not in plain.headers
+    assert json.loads(plain.body) == payload
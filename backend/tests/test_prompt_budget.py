@@ -0,0 +1,123 @@
+import pytest
+
+from prompt_budget import (
+    TRIM_MARKER,
+    PromptBuilder,
+    TokenizerApprox,
+    estimate_tokens,
+    get_token_budget,
+    get_tokenizer,
+    resolve_model,
+    trim_head,
+    trim_head_tail,
+    trim_lines,
+    trim_tail,
+)
+
+LATIN = "Deep learning has been widely used in medical image segmentation. " * 40
+CJK = "深度学习在医学图像分割中被广泛使用。" * 40
+
+@pytest.fixture
+def tokenizer():
+    return TokenizerApprox(chars_per_token=4.0, wide_tokens_per_char=1.0)
+
+# ===== Token Estimation =====
+
+def test_empty_text_costs_nothing(tokenizer):
+    assert tokenizer.estimate("") == 0
+
+def test_latin_text_costs_about_a_quarter_token_per_char(tokenizer):
+    assert tokenizer.estimate("abcd" * 100) == 101
+
+def test_cjk_text_costs_about_one_token_per_char(tokenizer):
+    assert tokenizer.estimate("学" * 100) == 101
+
+def test_cjk_costs_more_than_latin_of_equal_length(tokenizer):
+    assert tokenizer.estimate(CJK[:500]) > 3 * tokenizer.estimate(LATIN[:500])
+
+def test_mixed_text_counts_both_parts(tokenizer):
+    assert tokenizer.estimate("abcd" * 10 + "学" * 10) == 21
+
+def test_models_resolve_to_budgets_and_tokenizers():
+    assert resolve_model("gemini-pro") == "gemini-1.5-pro"
+    assert resolve_model("flash") == "gemini-1.5-flash"
+    assert get_token_budget("pro") > get_token_budget("flash")
+    assert get_tokenizer("flash") is get_tokenizer("flash")
+    assert estimate_tokens("abcd" * 100) == 101
+
+# ===== Trimming Strategies =====
+
+@pytest.mark.parametrize("text", [LATIN, CJK])
+@pytest.mark.parametrize("strategy", [trim_head, trim_tail, trim_head_tail, trim_lines])
+@pytest.mark.parametrize("budget", [0, 5, 50, 300])
+def test_trimmed_text_fits_budget(tokenizer, text, strategy, budget):
+    assert tokenizer.estimate(strategy(text, budget, tokenizer)) <= budget
+
+def test_trim_head_and_tail_keep_their_ends(tokenizer):
+    assert LATIN.startswith(trim_head(LATIN, 50, tokenizer))
+    assert LATIN.endswith(trim_tail(LATIN, 50, tokenizer))
+    assert trim_tail(LATIN, 0, tokenizer) == ""
+
+def test_trim_head_tail_inserts_marker_between_ends(tokenizer):
+    trimmed = trim_head_tail(LATIN, 100, tokenizer)
+    head, _, tail = trimmed.partition(TRIM_MARKER)
+    assert TRIM_MARKER in trimmed
+    assert head and LATIN.startswith(head)
+    assert tail and LATIN.endswith(tail)
+    assert tokenizer.estimate(trimmed) <= 100
+
+def test_trim_head_tail_falls_back_to_head_for_tiny_budgets(tokenizer):
+    trimmed = trim_head_tail(LATIN, 5, tokenizer)
+    assert TRIM_MARKER not in trimmed
+    assert LATIN.startswith(trimmed)
+
+def test_trim_lines_keeps_whole_lines(tokenizer):
+    text = "\n".join(f"term{i} -> translation{i}" for i in range(100))
+    trimmed = trim_lines(text, 40, tokenizer)
+    assert trimmed
+    assert text.startswith(trimmed)
+    assert all(line.startswith("term") and "->" in line for line in trimmed.split("\n"))
+
+# ===== Prompt Builder =====
+
+TEMPLATE = "Instructions.\nGlossary:\n{glossary}\nText:\n{text}\nQuestion: {question}"
+
+def test_prompt_within_budget_is_untouched():
+    built = PromptBuilder("flash", budget=1000) \
+        .add("question", "What is this?") \
+        .add("text", "Short text.", strategy="head") \
+        .build("{question} {text}")
+    assert built.text == "What is this? Short text."
+    assert built.trimmed == []
+    assert built.model == "gemini-1.5-flash"
+
+def test_fixed_sections_are_never_trimmed():
+    question = "Q " * 300
+    built = PromptBuilder("flash", budget=400) \
+        .add("question", question) \
+        .add("glossary", "a -> b\n" * 200, strategy="lines") \
+        .add("text", LATIN, strategy="head_tail") \
+        .build(TEMPLATE)
+    assert question in built.text
+    assert set(built.trimmed) == {"glossary", "text"}
+    assert built.section_tokens["question"] == estimate_tokens(question)
+
+def test_trimmable_sections_share_remaining_budget_in_order():
+    built = PromptBuilder("flash", budget=600) \
+        .add("question", "Why?") \
+        .add("glossary", "cell -> 细胞", strategy="lines") \
+        .add("text", LATIN, strategy="head_tail") \
+        .build(TEMPLATE)
+    assert "cell -> 细胞" in built.text
+    assert built.trimmed == ["text"]
+    assert TRIM_MARKER in built.text
+    assert built.estimated_tokens <= built.budget
+
+def test_cjk_text_is_trimmed_harder_than_latin():
+    latin = PromptBuilder("flash", budget=300).add("text", LATIN, strategy="head").build("{text}")
+    cjk = PromptBuilder("flash", budget=300).add("text", CJK, strategy="head").build("{text}")
+    assert len(cjk.text) < len(latin.text) / 2
+
+def test_unknown_strategy_raises():
+    with pytest.raises(ValueError):
+        PromptBuilder("flash").add("text", LATIN, strategy="middle")
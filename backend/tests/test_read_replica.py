@@ -0,0 +1,76 @@
+import importlib
+import shutil
+import sys
+
+import pytest
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """database module bound to a primary and a replica SQLite file"""
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{primary}")
+    monkeypatch.setenv("DATABASE_REPLICA_URL", f"sqlite:///{replica}")
+    sys.modules.pop("database", None)
+    module = importlib.import_module("database")
+    module.init_db()
+    module.paths = (primary, replica)
+    yield module
+    module.engine.dispose()
+    module.read_engine.dispose()
+    sys.modules.pop("database", None)
+
+def read_session(database, user_id, collection):
+    gen = database.get_read_db(user_id, collection)
+    db = next(gen)
+    return db, gen
+
+def bound_file(db) -> str:
+    return db.get_bind().url.database
+
+def replicate(database):
+    """Bring the replica file up to date with the primary"""
+    primary, replica = database.paths
+    database.engine.dispose()
+    database.read_engine.dispose()
+    shutil.copyfile(primary, replica)
+
+def add_user_with_term(database):
+    db = database.SessionLocal()
+    try:
+        user = database.User(email="reader@example.com", password_hash="!")
+        db.add(user)
+        db.commit()
+        db.add(database.GlossaryTerm(user_id=user.id, source="cell", target="细胞"))
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+def test_read_after_write_goes_to_primary(database):
+    user_id = add_user_with_term(database)
+
+    db, gen = read_session(database, user_id, "glossary")
+    assert bound_file(db) == str(database.paths[0])
+    assert [t.source for t in db.query(database.GlossaryTerm).all()] == ["cell"]
+    gen.close()
+
+def test_read_goes_to_replica_once_caught_up(database):
+    user_id = add_user_with_term(database)
+    replicate(database)
+
+    db, gen = read_session(database, user_id, "glossary")
+    assert bound_file(db) == str(database.paths[1])
+    assert [t.source for t in db.query(database.GlossaryTerm).all()] == ["cell"]
+    gen.close()
+
+def test_untouched_collection_reads_from_replica(database):
+    user_id = add_user_with_term(database)
+
+    db, gen = read_session(database, user_id, "history")
+    assert bound_file(db) == str(database.paths[1])
+    gen.close()
+
+def test_reads_without_a_collection_use_primary(database):
+    db, gen = read_session(database, None, None)
+    assert bound_file(db) == str(database.paths[0])
+    gen.close()
@@ -0,0 +1,140 @@
+import random
+
+import pytest
+
+import text_diff
+from text_diff import ParagraphDiffer, apply_edits, myers_opcodes, tokenize, word_edits
+
+SAMPLES = [
+    ("", ""),
+    ("", "Inserted from nothing."),
+    ("Deleted entirely.", ""),
+    ("The results shows a significant improve.", "The results show a significant improvement."),
+    ("We propose a novel method for segmentation.", "We present a new segmentation method."),
+    ("深度学习在医学图像分割中被广泛使用。", "深度学习已被广泛应用于医学图像分割。"),
+    ("模型在 CT 数据上表现良好, but fails on MRI.", "模型在 CT 和 MRI 数据上均表现良好。"),
+    ("  leading and trailing  ", "leading and trailing"),
+]
+
+def nonblank_lines(text):
+    return [line for line in text.split("\n") if line.strip()]
+
+def random_text(rng, words=("cell", "model", "data", "学", "习", "，", ".", "results", " ", "  ")):
+    return "".join(rng.choice(words) + rng.choice(["", " "]) for _ in range(rng.randint(0, 30)))
+
+def edit_distance(a, b):
+    """Insert/delete distance by dynamic programming, for checking minimality"""
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cur[j] = prev[j - 1] if a[i - 1] == b[j - 1] else 1 + min(prev[j], cur[j - 1])
+        prev = cur
+    return prev[-1]
+
+# ===== Word Edits =====
+
+@pytest.mark.parametrize("text", [a for a, _ in SAMPLES] + [b for _, b in SAMPLES])
+def test_tokenize_round_trips(text):
+    assert "".join(tokenize(text)) == text
+
+def test_tokenize_splits_cjk_per_character():
+    assert tokenize("图像分割 model") == ["图", "像", "分", "割", " ", "model"]
+
+@pytest.mark.parametrize("original,revised", SAMPLES)
+def test_word_edits_reconstruct_revision(original, revised):
+    assert apply_edits(original, word_edits(original, revised)) == revised
+
+def test_word_edits_reconstruct_random_revisions():
+    rng = random.Random(7)
+    for _ in range(500):
+        original, revised = random_text(rng), random_text(rng)
+        edits = word_edits(original, revised)
+        assert apply_edits(original, edits) == revised
+        assert all(e["start"] <= e["end"] for e in edits)
+        assert all(a["end"] <= b["start"] for a, b in zip(edits, edits[1:]))
+
+def test_myers_opcodes_are_minimal():
+    rng = random.Random(11)
+    for _ in range(500):
+        a = [rng.choice("abc") for _ in range(rng.randint(0, 12))]
+        b = [rng.choice("abc") for _ in range(rng.randint(0, 12))]
+        cost = sum((a2 - a1) + (b2 - b1) for _, a1, a2, b1, b2 in myers_opcodes(a, b))
+        assert cost == edit_distance(a, b)
+
+def test_heavy_rewrite_falls_back_to_single_replace():
+    original = " ".join(f"w{i}" for i in range(3000))
+    revised = " ".join(f"v{i}" for i in range(3000))
+    edits = word_edits(original, revised)
+    assert len(edits) == 1 and edits[0]["op"] == "replace"
+    assert apply_edits(original, edits) == revised
+
+def test_too_many_tokens_falls_back_to_single_replace(monkeypatch):
+    monkeypatch.setattr(text_diff, "DIFF_MAX_TOKENS", 10)
+    original = "one two three four five six seven eight"
+    revised = "one 2 three 4 five 6 seven 8"
+    edits = word_edits(original, revised)
+    assert len(edits) == 1
+    assert apply_edits(original, edits) == revised
+
+# ===== Paragraph Differ =====
+
+def stream(original, revised, rng):
+    """Feed the revision to a ParagraphDiffer in random chunks"""
+    differ = ParagraphDiffer(original)
+    edits = []
+    pos = 0
+    while pos < len(revised):
+        size = rng.randint(1, 12)
+        edits.extend(differ.feed(revised[pos:pos + size]))
+        pos += size
+    edits.extend(differ.finish())
+    return differ, edits
+
+PARAGRAPH_CASES = [
+    # same paragraph count
+    ("First paragraph here.\n\nSecond one.", "First paragraph is here.\n\nThe second one."),
+    # extra revised paragraphs
+    ("Only one.", "Only one!\n\nA new second.\n\nAnd a third."),
+    # missing revised paragraphs
+    ("Keep me.\n\nDrop me.\n\nDrop me too.", "Keep me, edited."),
+    # everything dropped
+    ("Gone.\n\nAlso gone.", ""),
+    # empty and blank originals
+    ("", "Brand new text.\n\nSecond paragraph."),
+    ("\n  \n", "Written into a blank document."),
+    # CJK
+    ("第一段文字。\n\n第二段。", "第一段的文字。\n\n第二段内容。\n\n新增第三段。"),
+]
+
+@pytest.mark.parametrize("original,revised", PARAGRAPH_CASES)
+def test_paragraph_differ_reconstructs_paragraphs(original, revised):
+    rng = random.Random(3)
+    for _ in range(20):
+        differ, edits = stream(original, revised, rng)
+        result = apply_edits(original, edits)
+        assert nonblank_lines(result) == nonblank_lines(revised)
+        assert differ.edit_count == len(edits)
+        assert all(a["end"] <= b["start"] for a, b in zip(edits, edits[1:]))
+
+@pytest.mark.parametrize("original,revised", [
+    ("", "Brand new text.\n\nSecond paragraph."),
+    ("Only one.", "Only one!\n\nA new second."),
+    ("Keep me.\n\nDrop me.", "Keep me, edited."),
+])
+def test_paragraph_differ_matches_revision_exactly(original, revised):
+    differ, edits = stream(original, revised, random.Random(5))
+    assert apply_edits(original, edits) == revised
+
+def test_empty_original_has_no_leading_break():
+    differ = ParagraphDiffer("")
+    edits = differ.feed("New paragraph.\n") + differ.finish()
+    assert edits == [{"op": "insert", "start": 0, "end": 0, "text": "New paragraph."}]
+
+def test_random_paragraph_streams():
+    rng = random.Random(13)
+    for _ in range(200):
+        original = "\n\n".join(random_text(rng) for _ in range(rng.randint(0, 4)))
+        revised = "\n\n".join(random_text(rng) for _ in range(rng.randint(0, 4)))
+        _, edits = stream(original, revised, rng)
+        assert nonblank_lines(apply_edits(original, edits)) == nonblank_lines(revised)
@@ -0,0 +1,258 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ===== Tokenisation =====
+
+# CJK/kana/hangul characters are single tokens (no spaces between words);
+# everything else splits into words, whitespace runs and punctuation.
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"\s+|[{_CJK}]|[^\W{_CJK}]+|[^\w\s]")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into word-level tokens that concatenate back to the text"""
+    return _TOKEN_RE.findall(text)
+
+# ===== Myers Diff =====
+
+Opcode = Tuple[str, int, int, int, int]  # (tag, a_start, a_end, b_start, b_end)
+
+# Beyond these limits a paragraph is treated as rewritten and sent as one
+# replace. Diff time grows with tokens x edits; the default DIFF_MAX_WORK
+# keeps one paragraph well under a second of CPU, and hundreds of scattered
+# edits are of no use to a client anyway.
+DIFF_MAX_TOKENS = int(os.getenv("DIFF_MAX_TOKENS", "8000"))
+DIFF_MAX_EDITS = int(os.getenv("DIFF_MAX_EDITS", "600"))
+DIFF_MAX_WORK = int(os.getenv("DIFF_MAX_WORK", "1000000"))
+
+class _TooManyEdits(Exception):
+    pass
+
+def myers_opcodes(a: Sequence[str], b: Sequence[str], max_edits: Optional[int] = None) -> List[Opcode]:
+    """Shortest edit script between two token sequences (linear-space Myers).
+
+    Returns grouped non-equal opcodes only: 'replace', 'delete' or 'insert'
+    with half-open ranges into a and b, like difflib's get_opcodes(). When
+    the sequences are too long or differ by more than max_edits tokens
+    (default: DIFF_MAX_EDITS, lowered for long inputs to stay within
+    DIFF_MAX_WORK), the differing middle is returned as a single replace.
+    """
+    # Common prefix/suffix are free and usually most of a polished paragraph
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < len(a) - prefix and suffix < len(b) - prefix
+           and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]):
+        suffix += 1
+    a_mid = a[prefix:len(a) - suffix]
+    b_mid = b[prefix:len(b) - suffix]
+    if not a_mid and not b_mid:
+        return []
+
+    if max_edits is None:
+        max_edits = min(DIFF_MAX_EDITS, DIFF_MAX_WORK // (len(a_mid) + len(b_mid)))
+    try:
+        if len(a_mid) > DIFF_MAX_TOKENS or len(b_mid) > DIFF_MAX_TOKENS:
+            raise _TooManyEdits()
+        moves = _myers_moves(a_mid, b_mid, max_edits)
+    except _TooManyEdits:
+        return [_tag([0, len(a_mid), 0, len(b_mid)], prefix)]
+
+    opcodes: List[Opcode] = []
+    x = y = 0
+    pending: Optional[List[int]] = None  # [a_start, a_end, b_start, b_end]
+    for move in moves + ["="]:
+        if move == "=":
+            if pending:
+                opcodes.append(_tag(pending, prefix))
+                pending = None
+            if x < len(a_mid):
+                x += 1
+                y += 1
+            continue
+        if pending is None:
+            pending = [x, x, y, y]
+        if move == "-":
+            x += 1
+            pending[1] = x
+        else:
+            y += 1
+            pending[3] = y
+    return opcodes
+
+def _tag(span: List[int], offset: int) -> Opcode:
+    a1, a2, b1, b2 = (v + offset for v in span)
+    if a1 == a2:
+        return ("insert", a1, a2, b1, b2)
+    if b1 == b2:
+        return ("delete", a1, a2, b1, b2)
+    return ("replace", a1, a2, b1, b2)
+
+def _myers_moves(a: Sequence[str], b: Sequence[str], max_edits: Optional[int] = None) -> List[str]:
+    """Edit script as a list of '=', '-' (delete from a) and '+' (insert from b).
+
+    Divide and conquer on the middle snake (Myers 1986, section 4b), so
+    memory stays O(N+M); recursion depth is about log2 of the edit distance.
+    Raises _TooManyEdits if the edit distance exceeds max_edits.
+    """
+    moves: List[str] = []
+    _diff_box(a, b, 0, 0, len(a), len(b), moves, max_edits)
+    return moves
+
+def _diff_box(a, b, left: int, top: int, right: int, bottom: int, moves: List[str],
+              max_edits: Optional[int] = None):
+    if left == right or top == bottom:
+        moves.extend(["-"] * (right - left) + ["+"] * (bottom - top))
+        return
+    (x1, y1), (x2, y2), segment = _middle_snake(a, b, left, top, right, bottom, max_edits)
+    _diff_box(a, b, left, top, x1, y1, moves)
+    moves.extend(segment)
+    _diff_box(a, b, x2, y2, right, bottom, moves)
+
+def _middle_snake(a, b, left: int, top: int, right: int, bottom: int, max_edits: Optional[int]):
+    """Find a segment of an optimal path through the box, near its middle.
+
+    Returns (start, end, moves): the segment is at most one edit plus a run
+    of equal tokens, and an optimal path passes through both points. The
+    forward and backward searches run from opposite corners until they
+    overlap; v arrays are indexed by diagonal, negative indices wrap.
+    """
+    width, height = right - left, bottom - top
+    delta = width - height
+    max_d = (width + height + 1) // 2
+    vf = [0] * (2 * max_d + 2)
+    vb = [0] * (2 * max_d + 2)
+    vf[1] = left
+    vb[1] = bottom
+    for d in range(max_d + 1):
+        if max_edits is not None and 2 * d - 1 > max_edits:
+            raise _TooManyEdits()
+        # Forward search from the top-left corner, k = x - y (box-relative)
+        for k in range(d, -d - 1, -2):
+            if k == -d or (k != d and vf[k - 1] < vf[k + 1]):
+                px = x = vf[k + 1]
+                step = "+"
+            else:
+                px = vf[k - 1]
+                x = px + 1
+                step = "-"
+            y = top + (x - left) - k
+            py = y if d == 0 or x != px else y - 1
+            run = 0
+            while x < right and y < bottom and a[x] == b[y]:
+                x += 1
+                y += 1
+                run += 1
+            vf[k] = x
+            c = k - delta
+            if delta % 2 == 1 and -(d - 1) <= c <= d - 1 and y >= vb[c]:
+                return (px, py), (x, y), ([step] if d else []) + ["="] * run
+        # Backward search from the bottom-right corner, c = k - delta
+        for c in range(d, -d - 1, -2):
+            k = c + delta
+            if c == -d or (c != d and vb[c - 1] > vb[c + 1]):
+                py = y = vb[c + 1]
+                step = "-"
+            else:
+                py = vb[c - 1]
+                y = py - 1
+                step = "+"
+            x = left + (y - top) + k
+            px = x if d == 0 or y != py else x + 1
+            run = 0
+            while x > left and y > top and a[x - 1] == b[y - 1]:
+                x -= 1
+                y -= 1
+                run += 1
+            vb[c] = y
+            if delta % 2 == 0 and -d <= k <= d and x <= vf[k]:
+                return (x, y), (px, py), ["="] * run + ([step] if d else [])
+    raise AssertionError("middle snake not found")
+
+# ===== Edit Operations =====
+
+def word_edits(original: str, revised: str, base: int = 0) -> List[Dict]:
+    """Word-level edits turning `original` into `revised`.
+
+    Each edit is {"op", "start", "end", "text"}: replace original[start:end]
+    (offsets shifted by `base`, in code points) with `text`.
+    """
+    a = tokenize(original)
+    b = tokenize(revised)
+    starts = [0]
+    for token in a:
+        starts.append(starts[-1] + len(token))
+    return [
+        {"op": tag, "start": base + starts[a1], "end": base + starts[a2], "text": "".join(b[b1:b2])}
+        for tag, a1, a2, b1, b2 in myers_opcodes(a, b)
+    ]
+
+class ParagraphDiffer:
+    """Diff a streamed revision against the original, one paragraph at a time.
+
+    Paragraphs are non-empty lines. The n-th completed revised paragraph is
+    diffed against the n-th original one as soon as its line break arrives,
+    so edits can be sent while the model is still writing. Extra revised
+    paragraphs become inserts at the end; missing ones become deletes.
+    """
+
+    def __init__(self, original: str):
+        self.original = original
+        self.paragraphs = [(m.start(), m.end()) for m in re.finditer(r"[^\n]+", original)
+                           if m.group().strip()]
+        self.index = 0
+        self.buffer = ""
+        self.edit_count = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        self.buffer += chunk
+        if "\n" not in self.buffer:
+            return []
+        complete, self.buffer = self.buffer.rsplit("\n", 1)
+        return self._diff_lines(complete.split("\n"))
+
+    def finish(self) -> List[Dict]:
+        edits = self._diff_lines([self.buffer])
+        self.buffer = ""
+        if self.index < len(self.paragraphs):
+            # Drop the leftover paragraphs together with the breaks before them
+            start = self.paragraphs[self.index - 1][1] if self.index else 0
+            edits.append({"op": "delete", "start": start, "end": len(self.original), "text": ""})
+            self.edit_count += 1
+        self.index = len(self.paragraphs)
+        return edits
+
+    def _diff_lines(self, lines: Iterable[str]) -> List[Dict]:
+        edits = []
+        for line in lines:
+            if not line.strip():
+                continue
+            if self.index < len(self.paragraphs):
+                start, end = self.paragraphs[self.index]
+                edits.extend(word_edits(self.original[start:end], line, base=start))
+            elif self.paragraphs:
+                end = self.paragraphs[-1][1]
+                edits.append({"op": "insert", "start": end, "end": end, "text": "\n\n" + line})
+            elif self.index == 0:
+                # Nothing to anchor to: the first paragraph replaces the
+                # (blank) original, later ones follow it
+                edits.append({"op": "replace" if self.original else "insert",
+                              "start": 0, "end": len(self.original), "text": line})
+            else:
+                end = len(self.original)
+                edits.append({"op": "insert", "start": end, "end": end, "text": "\n\n" + line})
+            self.index += 1
+        self.edit_count += len(edits)
+        return edits
+
+def apply_edits(original: str, edits: Iterable[Dict]) -> str:
+    """Apply edits (sorted by start, non-overlapping) to the original text"""
+    out = []
+    pos = 0
+    for edit in edits:
+        out.append(original[pos:edit["start"]])
+        out.append(edit["text"])
+        pos = edit["end"]
+    out.append(original[pos:])
+    return "".join(out)